@@ -51,18 +51,18 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Page Specific Logic ---
     if (path.includes('products.html')) {
-        loadProducts();
+        watchChanges({ product: applyProductChange }, loadProducts);
         loadCategoriesForProducts();
         document.getElementById('addProductForm').addEventListener('submit', addProduct);
     } else if (path.includes('categories.html')) {
         loadCategories();
         document.getElementById('addCategoryForm').addEventListener('submit', addCategory);
     } else if (path.includes('orders.html')) {
-        loadOrders();
+        watchChanges({ order: applyOrderChange }, loadOrders);
     } else if (path.includes('customers.html')) {
-        loadCustomers();
+        watchChanges({ user: applyCustomerChange }, loadCustomers);
     } else if (path.includes('previews.html')) {
-        loadPreviews();
+        watchChanges({ preview: applyPreviewChange }, loadPreviews);
     } else if (path.includes('banners.html')) {
         loadBanners();
         document.getElementById('bannerUploadForm').addEventListener('submit', addBanner);
@@ -72,35 +72,76 @@ document.addEventListener('DOMContentLoaded', () => {
         document.getElementById('loginForm').addEventListener('submit', login);
     }
 
+    // --- Change feed ---
+    // Lists load once; after that /api/changes/stream pushes every changed row and the
+    // page patches that row in place instead of fetching the whole list again.
+    async function watchChanges(handlers, loadList) {
+        const entities = Object.keys(handlers).join(',');
+        // Take the feed position before loading the list and stream from there, so rows
+        // changed while the list loads still arrive (applying a change twice is harmless)
+        const response = await fetch(`http://localhost:3000/api/changes?entity=${entities}`);
+        const position = await response.json();
+        await loadList();
+        const source = new EventSource(`http://localhost:3000/api/changes/stream?entity=${entities}&since=${position.next_since}`);
+        source.addEventListener('change', event => {
+            const change = JSON.parse(event.data);
+            handlers[change.entity](change);
+        });
+        // We fell behind the server's change history: start over from a full load
+        source.addEventListener('reset', () => window.location.reload());
+    }
+
+    // Rows carry data-id; insertAt is where new rows go (0 = top, -1 = bottom, null = not shown until reload)
+    function applyRowChange(tableBody, change, renderRow, insertAt) {
+        const existing = tableBody.querySelector(`tr[data-id="${change.id}"]`);
+        if (change.op === 'delete') {
+            if (existing) existing.remove();
+            return;
+        }
+        if (existing) {
+            existing.innerHTML = '';
+            renderRow(existing, change.data);
+        } else if (change.op === 'insert' && insertAt !== null) {
+            renderRow(tableBody.insertRow(insertAt), change.data);
+        }
+    }
+
     // --- Existing Functions (moved below for clarity) ---
     async function loadProducts(page = 1) {
         const response = await fetch(`http://localhost:3000/api/products?page=${page}`);
         const data = await response.json();
         const productsTableBody = document.querySelector('#productsTable tbody');
         productsTableBody.innerHTML = '';
-        data.data.forEach(product => {
-            const row = productsTableBody.insertRow();
-            row.insertCell().textContent = product.id;
-            row.insertCell().textContent = product.product_code;
-            row.insertCell().textContent = product.name;
-            row.insertCell().textContent = product.description;
-            row.insertCell().textContent = product.price;
-            row.insertCell().textContent = product.image ? product.image.split(',')[0] : ''; // Display first image if multiple
-            row.insertCell().textContent = product.category;
-            row.insertCell().textContent = product.quantity;
-            const actionsCell = row.insertCell();
-            const editButton = document.createElement('button');
-            editButton.textContent = 'Edit';
-            editButton.onclick = () => editProduct(product);
-            actionsCell.appendChild(editButton);
-            const deleteButton = document.createElement('button');
-            deleteButton.textContent = 'Delete';
-            deleteButton.onclick = () => deleteProduct(product.id);
-            actionsCell.appendChild(deleteButton);
-        });
+        data.data.forEach(product => renderProductRow(productsTableBody.insertRow(), product));
         renderPagination(data.total_pages, data.current_page);
     }
 
+    function renderProductRow(row, product) {
+        row.dataset.id = product.id;
+        row.insertCell().textContent = product.id;
+        row.insertCell().textContent = product.product_code;
+        row.insertCell().textContent = product.name;
+        row.insertCell().textContent = product.description;
+        row.insertCell().textContent = product.price;
+        row.insertCell().textContent = product.image ? product.image.split(',')[0] : ''; // Display first image if multiple
+        row.insertCell().textContent = product.category;
+        row.insertCell().textContent = product.quantity;
+        const actionsCell = row.insertCell();
+        const editButton = document.createElement('button');
+        editButton.textContent = 'Edit';
+        editButton.onclick = () => editProduct(product);
+        actionsCell.appendChild(editButton);
+        const deleteButton = document.createElement('button');
+        deleteButton.textContent = 'Delete';
+        deleteButton.onclick = () => deleteProduct(product.id);
+        actionsCell.appendChild(deleteButton);
+    }
+
+    // New products are added from this page, which reloads the list itself
+    function applyProductChange(change) {
+        applyRowChange(document.querySelector('#productsTable tbody'), change, renderProductRow, null);
+    }
+
     function renderPagination(totalPages, currentPage) {
         const paginationContainer = document.querySelector('#pagination-container');
         if (!paginationContainer) return;
@@ -271,7 +312,6 @@ document.addEventListener('DOMContentLoaded', () => {
             },
             body: JSON.stringify(updatedProduct)
         });
-        loadProducts();
     }
 
     async function deleteProduct(id) {
@@ -279,7 +319,6 @@ document.addEventListener('DOMContentLoaded', () => {
         await fetch(`http://localhost:3000/api/products/${id}`, {
             method: 'DELETE'
         });
-        loadProducts();
     }
 
     async function loadCategories() {
@@ -369,36 +408,52 @@ document.addEventListener('DOMContentLoaded', () => {
         event.target.reset();
     }
 
-    async function loadOrders() {
-        const response = await fetch('http://localhost:3000/api/orders');
+    // Orders come newest first, one page at a time; "Load more" appends the next page
+    async function loadOrders(cursor = null) {
+        const url = cursor ? `http://localhost:3000/api/orders?cursor=${encodeURIComponent(cursor)}` : 'http://localhost:3000/api/orders';
+        const response = await fetch(url);
         const data = await response.json();
         const ordersTableBody = document.querySelector('#ordersTable tbody');
-        ordersTableBody.innerHTML = '';
-        data.data.forEach(order => {
-            const row = ordersTableBody.insertRow();
-            row.insertCell().textContent = order.id;
-            row.insertCell().textContent = order.customer_name;
-            row.insertCell().textContent = order.customer_phone;
-            row.insertCell().textContent = order.delivery_address;
-            row.insertCell().textContent = order.products;
-            row.insertCell().textContent = order.total;
-            const statusCell = row.insertCell();
-            const statusSelect = document.createElement('select');
-            statusSelect.innerHTML = `
-                <option value="New" ${order.status === 'New' ? 'selected' : ''}>New</option>
-                <option value="Processing" ${order.status === 'Processing' ? 'selected' : ''}>Processing</option>
-                <option value="Confirmed" ${order.status === 'Confirmed' ? 'selected' : ''}>Confirmed</option>
-                <option value="Packaging" ${order.status === 'Packaging' ? 'selected' : ''}>Packaging</option>
-                <option value="Delivering" ${order.status === 'Delivering' ? 'selected' : ''}>Delivering</option>
-                <option value="Delivered" ${order.status === 'Delivered' ? 'selected' : ''}>Delivered</option>
-            `;
-            statusCell.appendChild(statusSelect);
-            const actionsCell = row.insertCell();
-            const updateButton = document.createElement('button');
-            updateButton.textContent = 'Update';
-            updateButton.onclick = () => updateOrderStatus(order.id, statusSelect.value);
-            actionsCell.appendChild(updateButton);
-        });
+        if (!cursor) {
+            ordersTableBody.innerHTML = '';
+        }
+        const loadMoreButton = document.getElementById('loadMoreOrdersBtn');
+        if (loadMoreButton) {
+            loadMoreButton.style.display = data.next_cursor ? 'inline-block' : 'none';
+            loadMoreButton.onclick = () => loadOrders(data.next_cursor);
+        }
+        data.data.forEach(order => renderOrderRow(ordersTableBody.insertRow(), order));
+    }
+
+    function renderOrderRow(row, order) {
+        row.dataset.id = order.id;
+        row.insertCell().textContent = order.id;
+        row.insertCell().textContent = order.customer_name;
+        row.insertCell().textContent = order.customer_phone;
+        row.insertCell().textContent = order.delivery_address;
+        row.insertCell().textContent = order.products;
+        row.insertCell().textContent = order.total;
+        const statusCell = row.insertCell();
+        const statusSelect = document.createElement('select');
+        statusSelect.innerHTML = `
+            <option value="New" ${order.status === 'New' ? 'selected' : ''}>New</option>
+            <option value="Processing" ${order.status === 'Processing' ? 'selected' : ''}>Processing</option>
+            <option value="Confirmed" ${order.status === 'Confirmed' ? 'selected' : ''}>Confirmed</option>
+            <option value="Packaging" ${order.status === 'Packaging' ? 'selected' : ''}>Packaging</option>
+            <option value="Delivering" ${order.status === 'Delivering' ? 'selected' : ''}>Delivering</option>
+            <option value="Delivered" ${order.status === 'Delivered' ? 'selected' : ''}>Delivered</option>
+        `;
+        statusCell.appendChild(statusSelect);
+        const actionsCell = row.insertCell();
+        const updateButton = document.createElement('button');
+        updateButton.textContent = 'Update';
+        updateButton.onclick = () => updateOrderStatus(order.id, statusSelect.value);
+        actionsCell.appendChild(updateButton);
+    }
+
+    // Newest first, so new orders go on top
+    function applyOrderChange(change) {
+        applyRowChange(document.querySelector('#ordersTable tbody'), change, renderOrderRow, 0);
     }
 
     async function updateOrderStatus(id, status) {
@@ -410,29 +465,45 @@ document.addEventListener('DOMContentLoaded', () => {
                 },
                 body: JSON.stringify({ status })
             });
-        loadOrders();
     }
 
-    async function loadCustomers() {
-        const response = await fetch('http://localhost:3000/api/users');
+    // Customers come one page at a time; "Load more" appends the next page
+    async function loadCustomers(page = 1) {
+        const response = await fetch(`http://localhost:3000/api/users?page=${page}`);
         const data = await response.json();
         const customersTableBody = document.querySelector('#customersTable tbody');
-        customersTableBody.innerHTML = '';
-        data.data.forEach(user => {
-            const row = customersTableBody.insertRow();
-            row.insertCell().textContent = user.name;
-            row.insertCell().textContent = user.phone;
-            row.insertCell().textContent = user.order_count || 0;
-            const actionsCell = row.insertCell();
-            const statusButton = document.createElement('button');
-            statusButton.textContent = user.is_active ? 'Deactivate' : 'Activate';
-            statusButton.onclick = () => toggleUserStatus(user.id, !user.is_active);
-            actionsCell.appendChild(statusButton);
-            const deleteButton = document.createElement('button');
-            deleteButton.textContent = 'Delete';
-            deleteButton.onclick = () => deleteUser(user.id);
-            actionsCell.appendChild(deleteButton);
-        });
+        if (page === 1) {
+            customersTableBody.innerHTML = '';
+        }
+        const loadMoreButton = document.getElementById('loadMoreCustomersBtn');
+        if (loadMoreButton) {
+            loadMoreButton.style.display = page < data.total_pages ? 'inline-block' : 'none';
+            loadMoreButton.onclick = () => loadCustomers(page + 1);
+        }
+        data.data.forEach(user => renderCustomerRow(customersTableBody.insertRow(), user));
+    }
+
+    function renderCustomerRow(row, user) {
+        row.dataset.id = user.id;
+        row.insertCell().textContent = user.name;
+        row.insertCell().textContent = user.phone;
+        row.insertCell().textContent = user.order_count || 0;
+        row.insertCell().textContent = `৳${(user.lifetime_value || 0).toFixed(2)}`;
+        row.insertCell().textContent = user.last_order_at ? new Date(user.last_order_at).toLocaleDateString() : '-';
+        const actionsCell = row.insertCell();
+        const statusButton = document.createElement('button');
+        statusButton.textContent = user.is_active ? 'Deactivate' : 'Activate';
+        statusButton.onclick = () => toggleUserStatus(user.id, !user.is_active);
+        actionsCell.appendChild(statusButton);
+        const deleteButton = document.createElement('button');
+        deleteButton.textContent = 'Delete';
+        deleteButton.onclick = () => deleteUser(user.id);
+        actionsCell.appendChild(deleteButton);
+    }
+
+    // New customers belong on the last page, so they show up once it is loaded
+    function applyCustomerChange(change) {
+        applyRowChange(document.querySelector('#customersTable tbody'), change, renderCustomerRow, null);
     }
 
     async function toggleUserStatus(userId, newStatus) {
@@ -443,7 +514,6 @@ document.addEventListener('DOMContentLoaded', () => {
             },
             body: JSON.stringify({ is_active: newStatus })
         });
-        loadCustomers();
     }
 
     async function deleteUser(userId) {
@@ -451,7 +521,6 @@ document.addEventListener('DOMContentLoaded', () => {
         await fetch(`http://localhost:3000/api/users/${userId}`, {
             method: 'DELETE'
         });
-        loadCustomers();
     }
 
     async function loadPreviews() {
@@ -459,28 +528,34 @@ document.addEventListener('DOMContentLoaded', () => {
         const data = await response.json();
         const previewsTableBody = document.querySelector('#previewsTable tbody');
         previewsTableBody.innerHTML = '';
-        data.data.forEach(preview => {
-            const row = previewsTableBody.insertRow();
-            row.insertCell().textContent = preview.user_name;
-            row.insertCell().textContent = preview.user_phone;
-            row.insertCell().textContent = preview.preview_address;
-            row.insertCell().textContent = preview.schedule_date;
-            row.insertCell().textContent = preview.products;
-            const statusCell = row.insertCell();
-            const statusSelect = document.createElement('select');
-            statusSelect.innerHTML = `
-                <option value="Pending" ${preview.status === 'Pending' ? 'selected' : ''}>Pending</option>
-                <option value="Confirmed" ${preview.status === 'Confirmed' ? 'selected' : ''}>Confirmed</option>
-                <option value="Completed" ${preview.status === 'Completed' ? 'selected' : ''}>Completed</option>
-                <option value="Cancelled" ${preview.status === 'Cancelled' ? 'selected' : ''}>Cancelled</option>
-            `;
-            statusCell.appendChild(statusSelect);
-            const actionsCell = row.insertCell();
-            const updateButton = document.createElement('button');
-            updateButton.textContent = 'Update';
-            updateButton.onclick = () => updatePreviewStatus(preview.id, statusSelect.value);
-            actionsCell.appendChild(updateButton);
-        });
+        data.data.forEach(preview => renderPreviewRow(previewsTableBody.insertRow(), preview));
+    }
+
+    function renderPreviewRow(row, preview) {
+        row.dataset.id = preview.id;
+        row.insertCell().textContent = preview.user_name;
+        row.insertCell().textContent = preview.user_phone;
+        row.insertCell().textContent = preview.preview_address;
+        row.insertCell().textContent = preview.schedule_date;
+        row.insertCell().textContent = preview.products;
+        const statusCell = row.insertCell();
+        const statusSelect = document.createElement('select');
+        statusSelect.innerHTML = `
+            <option value="Pending" ${preview.status === 'Pending' ? 'selected' : ''}>Pending</option>
+            <option value="Confirmed" ${preview.status === 'Confirmed' ? 'selected' : ''}>Confirmed</option>
+            <option value="Completed" ${preview.status === 'Completed' ? 'selected' : ''}>Completed</option>
+            <option value="Cancelled" ${preview.status === 'Cancelled' ? 'selected' : ''}>Cancelled</option>
+        `;
+        statusCell.appendChild(statusSelect);
+        const actionsCell = row.insertCell();
+        const updateButton = document.createElement('button');
+        updateButton.textContent = 'Update';
+        updateButton.onclick = () => updatePreviewStatus(preview.id, statusSelect.value);
+        actionsCell.appendChild(updateButton);
+    }
+
+    function applyPreviewChange(change) {
+        applyRowChange(document.querySelector('#previewsTable tbody'), change, renderPreviewRow, -1);
     }
 
     async function updatePreviewStatus(previewId, newStatus) {
@@ -491,38 +566,20 @@ document.addEventListener('DOMContentLoaded', () => {
             },
             body: JSON.stringify({ status: newStatus })
         });
-        loadPreviews();
     }
 
     async function loadDashboardSummary() {
-        const productsResponse = await fetch('http://localhost:3000/api/products');
-        const productsData = await productsResponse.json();
-        document.getElementById('total-products').textContent = productsData.total_products;
-
-        const ordersResponse = await fetch('http://localhost:3000/api/orders');
-        const ordersData = await ordersResponse.json();
-        document.getElementById('total-orders').textContent = ordersData.data.length;
-
-        const usersResponse = await fetch('http://localhost:3000/api/users');
-        const usersData = await usersResponse.json();
-        document.getElementById('total-customers').textContent = usersData.data.length;
-
-        const salesResponse = await fetch('http://localhost:3000/api/dashboard/sales');
-        const salesData = await salesResponse.json();
-        document.getElementById('total-sales').textContent = `৳${salesData.total_sales.toFixed(2)}`;
-
-        const previewsResponse = await fetch('http://localhost:3000/api/dashboard/previews/count');
-        const previewsData = await previewsResponse.json();
-        document.getElementById('total-previews').textContent = previewsData.preview_count;
-
-        // Fetch monthly sales and previews data for charts
-        const monthlySalesResponse = await fetch('http://localhost:3000/api/dashboard/monthly_sales');
-        const monthlySalesData = await monthlySalesResponse.json();
+        // One request for all dashboard counts and chart series
+        const response = await fetch('http://localhost:3000/api/dashboard/summary');
+        const summary = (await response.json()).data;
 
-        const monthlyPreviewsResponse = await fetch('http://localhost:3000/api/dashboard/monthly_previews');
-        const monthlyPreviewsData = await monthlyPreviewsResponse.json();
+        document.getElementById('total-products').textContent = summary.total_products;
+        document.getElementById('total-orders').textContent = summary.total_orders;
+        document.getElementById('total-customers').textContent = summary.total_customers;
+        document.getElementById('total-sales').textContent = `৳${summary.total_sales.toFixed(2)}`;
+        document.getElementById('total-previews').textContent = summary.preview_count;
 
-        renderCharts(monthlySalesData.data, monthlyPreviewsData.data);
+        renderCharts(summary.monthly_sales, summary.monthly_previews);
     }
 
     function renderCharts(salesData, previewsData) {
@@ -1,290 +1,1847 @@
+import base64
+import bisect
+import click
+import csv
+import functools
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import logging
+import mimetypes
 import os
+import queue
+import re
+import shutil
+import threading
+import time
 import uuid
-from flask import Flask, request, jsonify, send_from_directory
+import zipfile
+import zlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from flask import Blueprint, Flask, Response, request, jsonify, make_response, send_file, send_from_directory, g, has_app_context, current_app
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.security import safe_join
 import sqlite3
 from PIL import Image # Import Pillow
-
-app = Flask(__name__)
-CORS(app)
-
+try:
+    import orjson # optional, much faster than the json module
+except ImportError:
+    orjson = None
+try:
+    import brotli # optional, responses fall back to gzip without it
+except ImportError:
+    brotli = None
+
+# Routes live on this blueprint; create_app() at the bottom of the file builds the app.
+# CLI commands stay top level: `flask --app app <command>` calls create_app() itself.
+api = Blueprint('api', __name__, cli_group=None)
+logger = logging.getLogger(__name__)
+
+# Defaults for create_app(config)
 DATABASE = 'seefirst.db'
 UPLOAD_FOLDER = 'uploads'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-# Create the upload folder if it doesn't exist
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Shown in place of an upload whose resize job hasn't finished yet
+PENDING_IMAGE_PLACEHOLDER = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="600" height="400" viewBox="0 0 600 400">'
+    '<rect width="600" height="400" fill="#e9ecef"/>'
+    '<text x="300" y="205" font-family="sans-serif" font-size="24" fill="#6c757d" text-anchor="middle">Processing image…</text>'
+    '</svg>'
+)
+
+# Resized variants of uploads (/uploads/<name>?w=&h=&fmt=) are generated once and kept
+# in VARIANT_FOLDER, evicting the least recently served files past VARIANT_CACHE_BYTES.
+# Upload names are never reused, so a variant URL can be cached forever.
+VARIANT_FOLDER = 'variants'
+VARIANT_CACHE_BYTES = 512 * 1024 * 1024
+MAX_VARIANT_DIMENSION = 2000
+VARIANT_FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+VARIANT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Sizes generated ahead of time by POST /api/images/variants
+STANDARD_IMAGE_SIZES = {
+    'thumb': (150, 150),
+    'card': (400, 300),
+    'detail': (800, 600),
+    'banner': (1600, 600),
+}
+
+variant_cache_lock = threading.Lock()
+variant_cache_bytes = None
 
 # Serve static files from the uploads folder
-@app.route('/uploads/<filename>')
+@api.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-
-def resize_image(image_path, output_path, size=(600, 400), quality=85):
+    upload_path = safe_join(current_app.config['UPLOAD_FOLDER'], filename)
+    if upload_path is None:
+        return jsonify({"error": "Image not found"}), 404
+    if not os.path.exists(upload_path):
+        conn = get_db_connection()
+        job = conn.execute('SELECT status FROM image_jobs WHERE id = ?', (filename,)).fetchone()
+        conn.close()
+        if job and job['status'] == 'pending':
+            return Response(PENDING_IMAGE_PLACEHOLDER, mimetype='image/svg+xml', headers={'Cache-Control': 'no-store'})
+    elif {'w', 'h', 'fmt'} & set(request.args):
+        return image_variant(filename)
+    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+
+def image_variant(filename):
+    width = request.args.get('w', 0, type=int)
+    height = request.args.get('h', 0, type=int)
+    if not 0 <= width <= MAX_VARIANT_DIMENSION or not 0 <= height <= MAX_VARIANT_DIMENSION:
+        return jsonify({"error": "w and h must be between 0 and %d" % MAX_VARIANT_DIMENSION}), 400
+    fmt = request.args.get('fmt')
+    if fmt is None:
+        fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    if fmt not in VARIANT_FORMATS:
+        return jsonify({"error": "fmt must be webp or jpeg"}), 400
+
+    variant_name = variant_name_for(filename, width, height, fmt)
+    created = not os.path.exists(os.path.join(current_app.config['VARIANT_FOLDER'], variant_name))
+    if created:
+        generate_variant(current_app.config['UPLOAD_FOLDER'], current_app.config['VARIANT_FOLDER'], filename, width, height, fmt)
+    track_variant(current_app.config['VARIANT_FOLDER'], variant_name, created)
+    response = send_from_directory(current_app.config['VARIANT_FOLDER'], variant_name, mimetype=VARIANT_FORMATS[fmt][1])
+    response.headers['Cache-Control'] = VARIANT_CACHE_CONTROL
+    if 'fmt' not in request.args:
+        response.headers['Vary'] = 'Accept'
+    return response
+
+def generate_variant(upload_folder, variant_folder, filename, width, height, fmt, quality=82):
+    # Fit the image inside width x height (0 = unbounded) without changing its aspect ratio.
+    # Runs in request threads and in the image process pool, so it only touches the filesystem.
+    variant_name = variant_name_for(filename, width, height, fmt)
+    variant_path = os.path.join(variant_folder, variant_name)
+    if os.path.exists(variant_path):
+        return variant_name
+    with Image.open(os.path.join(upload_folder, filename)) as img:
+        img.load()
+        if width or height:
+            img.thumbnail((width or img.width, height or img.height), Image.LANCZOS)
+        pil_format = VARIANT_FORMATS[fmt][0]
+        if pil_format == 'JPEG':
+            img = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+        # Write under a temp name so concurrent requests never serve a partial file
+        temp_path = '%s.%s.tmp' % (variant_path, uuid.uuid4().hex)
+        img.save(temp_path, pil_format, quality=quality, optimize=True)
+    os.replace(temp_path, variant_path)
+    return variant_name
+
+def variant_name_for(filename, width, height, fmt):
+    # Uploads are named by content hash, so the file name alone is unique
+    return '%s_%dx%d.%s' % (os.path.splitext(os.path.basename(filename))[0], width, height, fmt)
+
+def track_variant(variant_folder, variant_name, created):
+    # Bump the variant's mtime for LRU order and evict old ones once over budget
+    global variant_cache_bytes
+    variant_path = os.path.join(variant_folder, variant_name)
+    os.utime(variant_path)
+    with variant_cache_lock:
+        if variant_cache_bytes is None:
+            variant_cache_bytes = sum(entry.stat().st_size for entry in os.scandir(variant_folder) if entry.is_file())
+        elif created:
+            variant_cache_bytes += os.path.getsize(variant_path)
+        if variant_cache_bytes > VARIANT_CACHE_BYTES:
+            evict_variants(variant_folder)
+
+def evict_variants(variant_folder):
+    # Other workers share the folder, so recount from disk before evicting
+    global variant_cache_bytes
+    entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                     for entry in os.scandir(variant_folder) if entry.is_file())
+    total = sum(size for _, size, _ in entries)
+    # Evict down to 90% so the next few variants don't trigger another scan
+    for _, size, path in entries:
+        if total <= VARIANT_CACHE_BYTES * 0.9:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+    variant_cache_bytes = total
+
+# Stored uploads keep their aspect ratio and are only scaled down to fit this bound;
+# they are the source every /uploads/<name>?w=&h= variant is cut from
+STORED_IMAGE_MAX_SIZE = (MAX_VARIANT_DIMENSION, MAX_VARIANT_DIMENSION)
+
+def resize_image(image_path, output_path, size=STORED_IMAGE_MAX_SIZE, quality=85):
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
     with Image.open(image_path) as img:
-        img = img.resize(size, Image.LANCZOS)
+        img.thumbnail(size, Image.LANCZOS)
         # Save as JPEG for better compression, unless it's a PNG with transparency
         if img.mode in ('RGBA', 'P') and 'A' in img.getbands():
             img.save(output_path, optimize=True)
         else:
             img.convert('RGB').save(output_path, 'jpeg', quality=quality, optimize=True)
 
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Uploads are content-addressed: stored once as ab/cd/<sha256><ext> under the uploads
+# folder, and upload_refs counts the products, categories and banners using each file.
+# Resized images are addressed by the hash of their source bytes plus the resize
+# recipe, so the same photo uploaded twice is only stored and processed once.
+RESIZE_RECIPE = b'fit:%dx%d\n' % STORED_IMAGE_MAX_SIZE
+
+def hash_upload(stream, recipe=b''):
+    digest = hashlib.sha256(recipe)
+    for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def content_path(digest, original_name):
+    return '%s/%s/%s%s' % (digest[:2], digest[2:4], digest, os.path.splitext(original_name)[1].lower())
+
+def upload_file_path(path):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], *path.split('/'))
+
+def temp_upload_path(path):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], "temp_" + os.path.basename(path))
+
+def split_images(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+def add_upload_refs(conn, paths):
+    conn.executemany('INSERT INTO upload_refs (path, ref_count) VALUES (?, 1) ON CONFLICT (path) DO UPDATE SET ref_count = ref_count + 1',
+                     [(path,) for path in paths])
+
+def release_upload_refs(conn, paths):
+    # Returns the paths nobody references any more; delete them once the transaction commits
+    conn.executemany('UPDATE upload_refs SET ref_count = ref_count - 1 WHERE path = ?', [(path,) for path in paths])
+    unreferenced = []
+    for path in set(paths):
+        if conn.execute('DELETE FROM upload_refs WHERE path = ? AND ref_count <= 0', (path,)).rowcount:
+            unreferenced.append(path)
+    return unreferenced
+
+def delete_uploads(paths):
+    for path in paths:
+        filepath = upload_file_path(path)
+        if os.path.exists(filepath):
+            try:
+                os.remove(filepath)
+            except OSError as e:
+                logger.warning('Error deleting image %s: %s', filepath, e)
+
+# Uploaded images are resized in a process pool so requests return as soon as the
+# upload is on disk. Each image gets a row in image_jobs keyed by its content path.
+IMAGE_WORKERS = os.cpu_count() or 2
+image_executor = None
+image_executor_lock = threading.Lock()
+
+def get_image_executor():
+    # Created on first use so importing the app never forks
+    global image_executor
+    with image_executor_lock:
+        if image_executor is None:
+            image_executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        return image_executor
+
+# Pregenerated variants (POST /api/images/variants) get a smaller pool of their own,
+# so a large batch never queues ahead of upload resizing
+VARIANT_WORKERS = max(1, IMAGE_WORKERS // 2)
+variant_executor = None
+
+def get_variant_executor():
+    global variant_executor
+    with image_executor_lock:
+        if variant_executor is None:
+            variant_executor = ProcessPoolExecutor(max_workers=VARIANT_WORKERS)
+        return variant_executor
+
+def finish_variant(variant_folder, future):
+    error = future.exception()
+    if error:
+        logger.error('Variant pregeneration failed: %s', error)
+        return
+    try:
+        track_variant(variant_folder, future.result(), True)
+    except OSError as e:
+        logger.warning('Could not track variant %s: %s', future.result(), e)
+
+def queue_images(files):
+    # Hash the uploads, then save and queue only content that isn't stored yet.
+    # Returns the content paths, which exist once their job is 'ready'; callers
+    # take a reference with add_upload_refs when they store them.
+    staged = []
+    for file in files:
+        if file.filename != '':
+            path = content_path(hash_upload(file.stream, RESIZE_RECIPE), file.filename)
+            file.stream.seek(0)
+            staged.append((path, file.save))
+    if not staged:
+        return []
+    conn = get_db_connection()
+    jobs = claim_image_jobs(conn, staged)
+    conn.commit()
+    submit_image_jobs(jobs)
+    return [path for path, _ in staged]
+
+def claim_image_jobs(conn, staged):
+    # staged is a list of (content path, save) where save(temp_path) writes the upload.
+    # Content that is already stored, or that another request is processing, is reused.
+    jobs = []
+    for path, save in staged:
+        if os.path.exists(upload_file_path(path)):
+            continue
+        claimed = conn.execute("INSERT OR IGNORE INTO image_jobs (id, status) VALUES (?, 'pending')", (path,)).rowcount
+        if not claimed:
+            claimed = conn.execute("UPDATE image_jobs SET status = 'pending', error = NULL, finished_at = NULL WHERE id = ? AND status != 'pending'", (path,)).rowcount
+        if claimed:
+            os.makedirs(os.path.dirname(upload_file_path(path)), exist_ok=True)
+            temp_path = temp_upload_path(path)
+            save(temp_path)
+            jobs.append((path, temp_path))
+    return jobs
+
+def submit_image_jobs(jobs):
+    # Only call once the image_jobs rows are committed
+    for filename, temp_path in jobs:
+        submit_image_job(filename, temp_path)
+
+def submit_image_job(filename, temp_path):
+    output_path = upload_file_path(filename)
+    future = get_image_executor().submit(resize_image, temp_path, output_path)
+    future.add_done_callback(functools.partial(finish_image_job, filename, temp_path))
+
+def finish_image_job(filename, temp_path, future):
+    error = future.exception()
+    if os.path.exists(temp_path):
+        os.remove(temp_path) # Remove temporary file
+    conn = db_pool.acquire()
+    conn.execute('UPDATE image_jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?',
+                 ('failed' if error else 'ready', str(error) if error else None, filename))
+    conn.commit()
+    conn.close()
 
-def init_db():
-    with app.app_context():
-        db = get_db_connection()
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                description TEXT,
-                price REAL NOT NULL,
-                offer_price REAL,
-                image TEXT,
-                category TEXT,
-                colors TEXT,
-                condition TEXT,
-                product_code TEXT,
-                quantity INTEGER
-            )
-        ''')
-        # Add new columns if they don't exist
+# Request and SQL metrics (per worker process), served in Prometheus text format at
+# /metrics. Every statement run on a pooled connection is timed; each response also
+# carries the request's DB time and query count in X-DB-Time / X-DB-Queries.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_QUERY_SECONDS = 0.1
+MAX_SLOW_QUERIES = 200 # distinct statements kept for /metrics
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {} # (endpoint, method, status) -> Histogram
+        self.queries = {} # statement type -> Histogram
+        self.slow_queries = {} # normalized SQL -> [count, seconds]
+
+    def observe_request(self, endpoint, method, status, seconds):
+        with self.lock:
+            key = (endpoint, method, str(status))
+            if key not in self.requests:
+                self.requests[key] = Histogram()
+            self.requests[key].observe(seconds)
+
+    def observe_query(self, sql, seconds, rows=None):
+        # rows is set for executemany, which is timed as one call over all its rows
+        kind = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'OTHER'
+        if rows is not None:
+            kind += ' (executemany)'
+        with self.lock:
+            if kind not in self.queries:
+                self.queries[kind] = Histogram()
+            self.queries[kind].observe(seconds)
+        if seconds >= SLOW_QUERY_SECONDS:
+            normalized = normalize_sql(sql)
+            if rows is not None:
+                normalized = '(executemany) ' + normalized
+            with self.lock:
+                if normalized in self.slow_queries or len(self.slow_queries) < MAX_SLOW_QUERIES:
+                    slow = self.slow_queries.setdefault(normalized, [0, 0.0])
+                    slow[0] += 1
+                    slow[1] += seconds
+            if rows is not None:
+                logger.warning('Slow query (%.1f ms, %d rows): %s', seconds * 1000, rows, normalized)
+            else:
+                logger.warning('Slow query (%.1f ms): %s', seconds * 1000, normalized)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            lines += render_histogram('seefirst_http_request_duration_seconds', 'Request latency by Flask endpoint, method and status.',
+                                      [({'endpoint': endpoint, 'method': method, 'status': status}, histogram) for (endpoint, method, status), histogram in sorted(self.requests.items())])
+            lines += render_histogram('seefirst_sql_query_duration_seconds', 'SQL statement latency by statement type.',
+                                      [({'statement': kind}, histogram) for kind, histogram in sorted(self.queries.items())])
+            lines.append('# HELP seefirst_sql_slow_queries_total Statements slower than %g seconds, by normalized SQL.' % SLOW_QUERY_SECONDS)
+            lines.append('# TYPE seefirst_sql_slow_queries_total counter')
+            for sql, (count, seconds) in sorted(self.slow_queries.items()):
+                lines.append('seefirst_sql_slow_queries_total%s %d' % (render_labels({'sql': sql}), count))
+            lines.append('# HELP seefirst_sql_slow_query_seconds_total Time spent in slow statements, by normalized SQL.')
+            lines.append('# TYPE seefirst_sql_slow_query_seconds_total counter')
+            for sql, (count, seconds) in sorted(self.slow_queries.items()):
+                lines.append('seefirst_sql_slow_query_seconds_total%s %.6f' % (render_labels({'sql': sql}), seconds))
+        return lines
+
+def render_labels(labels):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{%s}' % ','.join('%s="%s"' % (name, value) for name, value in zip(labels, escaped))
+
+def render_histogram(name, help_text, series):
+    lines = ['# HELP %s %s' % (name, help_text), '# TYPE %s histogram' % name]
+    for labels, histogram in series:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram.counts):
+            cumulative += count
+            lines.append('%s_bucket%s %d' % (name, render_labels(dict(labels, le=bound)), cumulative))
+        lines.append('%s_sum%s %.6f' % (name, render_labels(labels), histogram.total))
+        lines.append('%s_count%s %d' % (name, render_labels(labels), cumulative))
+    return lines
+
+def normalize_sql(sql):
+    # Strip literals and collapse IN lists so one statement shape is one series
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)+\s*\)', '(?, ...)', sql)
+    return ' '.join(sql.split())
+
+metrics = Metrics()
+
+def record_query(sql, seconds, rows=None):
+    metrics.observe_query(sql, seconds, rows)
+    if has_app_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_time += seconds
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
         try:
-            db.execute("ALTER TABLE products ADD COLUMN offer_price REAL");
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" not in str(e):
-                raise
-        try:
-            db.execute("ALTER TABLE products ADD COLUMN colors TEXT");
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" not in str(e):
-                raise
-        try:
-            db.execute("ALTER TABLE products ADD COLUMN condition TEXT");
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" not in str(e):
-                raise
-        try:
-            db.execute("ALTER TABLE products ADD COLUMN product_code TEXT");
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" not in str(e):
-                raise
+            return super().execute(sql, parameters)
+        finally:
+            record_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
         try:
-            db.execute("ALTER TABLE products ADD COLUMN quantity INTEGER");
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" not in str(e):
-                raise
-
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                image TEXT
-            )
-        """)
-        # Add image column if it doesn't exist (for existing databases)
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(sql, time.perf_counter() - started, max(self.rowcount, 0))
+
+# Connection pool settings (per worker process)
+DB_POOL_SIZE = 8
+DB_CACHED_STATEMENTS = 256
+DB_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+)
+
+class PooledConnection(sqlite3.Connection):
+    # close() hands the connection back to the pool instead of closing it.
+    # Connections bound to a request are released on app context teardown.
+    pool = None
+    request_bound = False
+    checked_out = False
+
+    def close(self):
+        if self.request_bound or not self.checked_out:
+            return
+        self.pool.release(self)
+
+    # Route every statement through TimedCursor
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+class ConnectionPool:
+    def __init__(self, database, size=DB_POOL_SIZE):
+        self.database = database
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.in_use = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, factory=PooledConnection, check_same_thread=False,
+                               cached_statements=DB_CACHED_STATEMENTS)
+        conn.row_factory = sqlite3.Row
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        conn.pool = self
+        return conn
+
+    def acquire(self):
         try:
-            db.execute("ALTER TABLE categories ADD COLUMN image TEXT");
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" not in str(e):
-                raise
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS orders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                product_id INTEGER NOT NULL,
-                quantity INTEGER NOT NULL,
-                customer_name TEXT,
-                customer_phone TEXT,
-                status TEXT DEFAULT 'pending',
-                FOREIGN KEY (product_id) REFERENCES products(id)
-            )
-        ''')
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS banners (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                image TEXT NOT NULL
-            )
-        ''')
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                phone TEXT NOT NULL UNIQUE,
-                email TEXT UNIQUE,
-                password TEXT NOT NULL,
-                is_active BOOLEAN DEFAULT 1
-            )
-        ''')
-        try:
-            db.execute("ALTER TABLE users ADD COLUMN is_active BOOLEAN DEFAULT 1");
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" not in str(e):
-                raise
+            conn = self.idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            conn = self._connect()
+            reused = False
+        with self.lock:
+            if reused:
+                self.reused += 1
+            else:
+                self.created += 1
+            self.in_use += 1
+        conn.checked_out = True
+        return conn
+
+    def release(self, conn):
+        conn.request_bound = False
+        conn.checked_out = False
+        if conn.in_transaction:
+            conn.rollback()
+        with self.lock:
+            self.in_use -= 1
+            keep = self.idle.qsize() < self.size
+            if not keep:
+                self.discarded += 1
+        if keep:
+            self.idle.put(conn)
+        else:
+            sqlite3.Connection.close(conn)
+
+    def close_idle(self):
+        # Before forking workers: a SQLite connection must never be used by two processes
+        while True:
+            try:
+                sqlite3.Connection.close(self.idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": self.size,
+                "idle": self.idle.qsize(),
+                "in_use": self.in_use,
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+            }
+
+db_pool = None # created by create_app()
+
+def get_db_connection():
+    # Inside a request one pooled connection is shared by the whole handler;
+    # outside an app context the caller owns it until close().
+    if not has_app_context():
+        return db_pool.acquire()
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+        g.db.request_bound = True
+    return g.db
+
+def release_db_connection(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.release(conn)
+
+@api.route('/api/db/stats', methods=['GET'])
+def get_db_stats():
+    return jsonify({"message": "success", "data": db_pool.stats(), "response_cache": response_cache.stats()})
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.db_time = 0.0
+    g.db_queries = 0
+
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    metrics.observe_request(request.endpoint or 'unmatched', request.method, response.status_code, elapsed)
+    response.headers['X-DB-Time'] = '%.3f' % (g.db_time * 1000) # milliseconds
+    response.headers['X-DB-Queries'] = str(g.db_queries)
+    response.headers['Server-Timing'] = 'db;dur=%.3f, app;dur=%.3f' % (g.db_time * 1000, elapsed * 1000)
+    return response
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    lines = metrics.render()
+    pool = db_pool.stats()
+    cache = response_cache.stats()
+    for name, value, help_text in (
+        ('seefirst_db_pool_in_use', pool['in_use'], 'Pooled connections checked out.'),
+        ('seefirst_db_pool_idle', pool['idle'], 'Pooled connections waiting to be reused.'),
+        ('seefirst_response_cache_entries', cache['entries'], 'Responses held in the response cache.'),
+    ):
+        lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s gauge' % name, '%s %d' % (name, value)]
+    for name, value, help_text in (
+        ('seefirst_db_pool_connections_created_total', pool['created'], 'Connections opened by the pool.'),
+        ('seefirst_response_cache_hits_total', cache['hits'], 'Response cache hits.'),
+        ('seefirst_response_cache_misses_total', cache['misses'], 'Response cache misses.'),
+        ('seefirst_order_batches_total', order_writer.batches, 'Transactions committed by the order writer.'),
+        ('seefirst_orders_written_total', order_writer.orders, 'Orders committed by the order writer.'),
+    ):
+        lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s counter' % name, '%s %d' % (name, value)]
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+# Response compression: bodies of COMPRESS_MIN_BYTES or more are gzip- or brotli-encoded
+# to match Accept-Encoding. Cached responses keep their encoded bodies, so a hot page
+# is compressed once per encoding rather than once per request.
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html', 'text/css', 'text/javascript', 'image/svg+xml'}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+CONTENT_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def choose_encoding(mimetype, size):
+    if mimetype not in COMPRESS_MIMETYPES or size < COMPRESS_MIN_BYTES:
+        return None
+    return request.accept_encodings.best_match(CONTENT_ENCODINGS)
+
+def encode_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def gzip_stream(chunks):
+    # Streamed responses (exports) are gzipped chunk by chunk without buffering the body
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def compress_response(response):
+    if response.mimetype not in COMPRESS_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.direct_passthrough or 'Content-Encoding' in response.headers or response.status_code in (204, 206, 304):
+        return response
+    if response.is_streamed:
+        # Only real streams like exports; werkzeug's error and redirect pages are tiny
+        if response.status_code == 200 and 'gzip' in CONTENT_ENCODINGS and request.accept_encodings['gzip']:
+            response.response = gzip_stream(response.iter_encoded())
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers.pop('Content-Length', None)
+        return response
+    body = response.get_data()
+    encoding = choose_encoding(response.mimetype, len(body))
+    if encoding:
+        response.set_data(encode_body(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        # Same content in another encoding: the ETag still applies, but only weakly
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(etag, weak=True)
+    return response
+
+# Production builds of the front ends (python build_static.py) are served from
+# STATIC_BUILD_FOLDER under /admin/ and /user/, precompressed to match Accept-Encoding.
+# CSS and JS names carry a content hash and are cached forever; HTML is revalidated.
+STATIC_BUILD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static-build')
+STATIC_ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+STATIC_HTML_CACHE_CONTROL = 'no-cache'
+
+@api.route('/<any(admin, user):site>/')
+@api.route('/<any(admin, user):site>/<path:filename>')
+def static_build_file(site, filename='index.html'):
+    path = safe_join(current_app.config['STATIC_BUILD_FOLDER'], site, filename)
+    if path is None or not os.path.isfile(path) or filename.endswith(tuple(STATIC_ENCODING_SUFFIXES.values())):
+        return jsonify({"error": "File not found"}), 404
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    available = [encoding for encoding, suffix in STATIC_ENCODING_SUFFIXES.items() if os.path.isfile(path + suffix)]
+    encoding = request.accept_encodings.best_match(available) if available else None
+    response = send_file(path + STATIC_ENCODING_SUFFIXES[encoding] if encoding else path, mimetype=mimetype, download_name=os.path.basename(path))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if available:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = STATIC_HTML_CACHE_CONTROL if mimetype == 'text/html' else VARIANT_CACHE_CONTROL
+    return response
+
+# Full-text search over products.name/description (external content FTS5 table)
+PRODUCTS_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+)
+# bm25 column weights: a hit in the name counts more than one in the description
+SEARCH_RANK = 'bm25(products_fts, 10.0, 1.0)'
+SEARCH_SNIPPET = "snippet(products_fts, -1, '<mark>', '</mark>', '…', 12)"
+
+def init_search_index(db):
+    exists = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone()
+    for statement in PRODUCTS_FTS_DDL:
+        db.execute(statement)
+    if not exists:
+        rebuild_search_index(db)
+
+def rebuild_search_index(db):
+    db.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+def build_search_match(search_query):
+    # Every word must match, each as a prefix so results update per keystroke
+    terms = re.findall(r'\w+', search_query, re.UNICODE)
+    return ' '.join('"%s"*' % term for term in terms)
+
+@api.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the products full-text search index from the products table."""
+    init_db()
+    db = db_pool.acquire()
+    rebuild_search_index(db)
+    db.commit()
+    db.close()
+    print('Search index rebuilt.')
+
+# Schema migrations, applied in order and tracked in PRAGMA user_version.
+# Append new steps to MIGRATIONS; never edit one that has shipped.
+def add_missing_columns(db, table, columns):
+    existing = {row['name'] for row in db.execute('PRAGMA table_info(%s)' % table)}
+    for name, definition in columns:
+        if name not in existing:
+            db.execute('ALTER TABLE %s ADD COLUMN %s %s' % (table, name, definition))
+
+def migrate_base_schema(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            price REAL NOT NULL,
+            offer_price REAL,
+            image TEXT,
+            category TEXT,
+            colors TEXT,
+            condition TEXT,
+            product_code TEXT,
+            quantity INTEGER
+        )
+    ''')
+    # Databases created before these columns existed
+    add_missing_columns(db, 'products', [
+        ('offer_price', 'REAL'),
+        ('colors', 'TEXT'),
+        ('condition', 'TEXT'),
+        ('product_code', 'TEXT'),
+        ('quantity', 'INTEGER'),
+    ])
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            image TEXT
+        )
+    """)
+    add_missing_columns(db, 'categories', [('image', 'TEXT')])
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            customer_name TEXT,
+            customer_phone TEXT,
+            status TEXT DEFAULT 'pending',
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+    ''')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS banners (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            image TEXT NOT NULL
+        )
+    ''')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL UNIQUE,
+            email TEXT UNIQUE,
+            password TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT 1
+        )
+    ''')
+    add_missing_columns(db, 'users', [('is_active', 'BOOLEAN DEFAULT 1')])
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS new_orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_name TEXT NOT NULL,
+            customer_phone TEXT NOT NULL,
+            delivery_address TEXT NOT NULL,
+            delivery_location TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            bkash_trx_id TEXT,
+            subtotal REAL NOT NULL,
+            delivery_charge REAL NOT NULL,
+            total REAL NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES new_orders(id),
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+    ''')
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS previews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_name TEXT NOT NULL,
+            user_phone TEXT NOT NULL,
+            preview_address TEXT NOT NULL,
+            schedule_date TEXT NOT NULL,
+            products TEXT NOT NULL,
+            status TEXT DEFAULT 'Pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def migrate_product_browsing(db):
+    # Composite indexes backing the keyset orderings of /api/products
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_price_id ON products (price, id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_category_id ON products (category, id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_category_price_id ON products (category, price, id)')
+    init_search_index(db)
+
+def migrate_order_indexes(db):
+    db.execute('CREATE INDEX IF NOT EXISTS idx_new_orders_customer_phone ON new_orders (customer_phone)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_new_orders_status_created_at ON new_orders (status, created_at)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_new_orders_created_at ON new_orders (created_at)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items (order_id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_previews_created_at ON previews (created_at)')
+    # Older versions re-inserted the demo rows on every boot; keep one copy of each
+    for order in DEMO_ORDERS:
+        db.execute('DELETE FROM new_orders WHERE customer_name = ? AND customer_phone = ? AND created_at = ? AND total = ? AND id > (SELECT MIN(id) FROM new_orders WHERE customer_name = ? AND customer_phone = ? AND created_at = ? AND total = ?)', (order[0], order[1], order[10], order[8]) * 2)
+    for preview in DEMO_PREVIEWS:
+        db.execute('DELETE FROM previews WHERE user_name = ? AND user_phone = ? AND created_at = ? AND products = ? AND id > (SELECT MIN(id) FROM previews WHERE user_name = ? AND user_phone = ? AND created_at = ? AND products = ?)', (preview[0], preview[1], preview[6], preview[4]) * 2)
+
+def migrate_image_jobs(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS image_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_image_jobs_status ON image_jobs (status)')
+
+# Dashboard rollups: order and preview counts/amounts per (period, status), kept per day
+# and per month. Writers call apply_order_stats/apply_preview_stats in their own
+# transaction, with -1 before changing a row and +1 after.
+ROLLUP_TABLES = {
+    'order_stats_daily': ('new_orders', 'DATE(created_at)'),
+    'order_stats_monthly': ('new_orders', "STRFTIME('%Y-%m', created_at)"),
+    'preview_stats_daily': ('previews', 'DATE(created_at)'),
+    'preview_stats_monthly': ('previews', "STRFTIME('%Y-%m', created_at)"),
+}
+
+def apply_order_stats(conn, order_id, sign):
+    for table in ('order_stats_daily', 'order_stats_monthly'):
+        conn.execute('''
+            INSERT INTO %s (period, status, order_count, total_amount)
+            SELECT %s, COALESCE(status, ''), ?, ? * total FROM new_orders WHERE id = ?
+            ON CONFLICT (period, status) DO UPDATE SET
+                order_count = order_count + excluded.order_count,
+                total_amount = total_amount + excluded.total_amount
+        ''' % (table, ROLLUP_TABLES[table][1]), (sign, sign, order_id))
+    # Per-customer aggregates; lifetime value counts delivered orders only
+    conn.execute('''
+        INSERT INTO customer_stats (phone, order_count, lifetime_value, last_order_at)
+        SELECT customer_phone, ?, CASE WHEN status = 'Delivered' THEN ? * total ELSE 0 END, created_at FROM new_orders WHERE id = ?
+        ON CONFLICT (phone) DO UPDATE SET
+            order_count = order_count + excluded.order_count,
+            lifetime_value = lifetime_value + excluded.lifetime_value,
+            last_order_at = MAX(COALESCE(last_order_at, ''), excluded.last_order_at)
+    ''', (sign, sign, order_id))
+
+def apply_preview_stats(conn, preview_id, sign):
+    for table in ('preview_stats_daily', 'preview_stats_monthly'):
+        conn.execute('''
+            INSERT INTO %s (period, status, preview_count)
+            SELECT %s, COALESCE(status, ''), ? FROM previews WHERE id = ?
+            ON CONFLICT (period, status) DO UPDATE SET preview_count = preview_count + excluded.preview_count
+        ''' % (table, ROLLUP_TABLES[table][1]), (sign, preview_id))
+
+def rebuild_rollups(db):
+    for table, (source, period) in ROLLUP_TABLES.items():
+        db.execute('DELETE FROM %s' % table)
+        if source == 'new_orders':
+            db.execute("INSERT INTO %s (period, status, order_count, total_amount) SELECT %s, COALESCE(status, ''), COUNT(*), SUM(total) FROM new_orders GROUP BY 1, 2" % (table, period))
+        else:
+            db.execute("INSERT INTO %s (period, status, preview_count) SELECT %s, COALESCE(status, ''), COUNT(*) FROM previews GROUP BY 1, 2" % (table, period))
+
+def rebuild_customer_stats(db):
+    db.execute('DELETE FROM customer_stats')
+    db.execute("INSERT INTO customer_stats (phone, order_count, lifetime_value, last_order_at) SELECT customer_phone, COUNT(*), TOTAL(CASE WHEN status = 'Delivered' THEN total END), MAX(created_at) FROM new_orders GROUP BY customer_phone")
+
+def migrate_dashboard_rollups(db):
+    for table in ('order_stats_daily', 'order_stats_monthly'):
         db.execute('''
-            CREATE TABLE IF NOT EXISTS new_orders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                customer_name TEXT NOT NULL,
-                customer_phone TEXT NOT NULL,
-                delivery_address TEXT NOT NULL,
-                delivery_location TEXT NOT NULL,
-                payment_method TEXT NOT NULL,
-                bkash_trx_id TEXT,
-                subtotal REAL NOT NULL,
-                delivery_charge REAL NOT NULL,
-                total REAL NOT NULL,
-                status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+            CREATE TABLE IF NOT EXISTS %s (
+                period TEXT NOT NULL,
+                status TEXT NOT NULL,
+                order_count INTEGER NOT NULL DEFAULT 0,
+                total_amount REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (period, status)
+            ) WITHOUT ROWID
+        ''' % table)
+    for table in ('preview_stats_daily', 'preview_stats_monthly'):
         db.execute('''
-            CREATE TABLE IF NOT EXISTS order_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                order_id INTEGER NOT NULL,
-                product_id INTEGER NOT NULL,
-                quantity INTEGER NOT NULL,
-                price REAL NOT NULL,
-                FOREIGN KEY (order_id) REFERENCES new_orders(id),
-                FOREIGN KEY (product_id) REFERENCES products(id)
-            )
-        ''')
+            CREATE TABLE IF NOT EXISTS %s (
+                period TEXT NOT NULL,
+                status TEXT NOT NULL,
+                preview_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (period, status)
+            ) WITHOUT ROWID
+        ''' % table)
+    rebuild_rollups(db)
+
+def migrate_product_imports(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL DEFAULT 'running',
+            total_rows INTEGER NOT NULL DEFAULT 0,
+            processed_rows INTEGER NOT NULL DEFAULT 0,
+            inserted_rows INTEGER NOT NULL DEFAULT 0,
+            skipped_rows INTEGER NOT NULL DEFAULT 0,
+            errors TEXT NOT NULL DEFAULT '[]',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Imports skip rows whose product_code already exists
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_product_code ON products (product_code)')
+
+def migrate_customer_stats(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS customer_stats (
+            phone TEXT PRIMARY KEY,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            lifetime_value REAL NOT NULL DEFAULT 0,
+            last_order_at TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_customer_stats_order_count ON customer_stats (order_count)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_customer_stats_lifetime_value ON customer_stats (lifetime_value)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_customer_stats_last_order_at ON customer_stats (last_order_at)')
+    rebuild_customer_stats(db)
+
+def migrate_order_listing_indexes(db):
+    # /api/orders pages on id DESC within a phone or status filter
+    db.execute('CREATE INDEX IF NOT EXISTS idx_new_orders_customer_phone_id ON new_orders (customer_phone, id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_new_orders_status_id ON new_orders (status, id)')
+    db.execute('DROP INDEX IF EXISTS idx_new_orders_customer_phone')
+
+def migrate_upload_refs(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS upload_refs (
+            path TEXT PRIMARY KEY,
+            ref_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    rebuild_upload_refs(db)
+
+def rebuild_upload_refs(db):
+    db.execute('DELETE FROM upload_refs')
+    for row in db.execute('SELECT image FROM products UNION ALL SELECT image FROM categories UNION ALL SELECT image FROM banners').fetchall():
+        add_upload_refs(db, split_images(row['image']))
+
+def migrate_change_log(db):
+    # Triggers log every product and category write, so each worker's in-memory
+    # catalog can catch up on changes made by other workers
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for table, entity in (('products', 'product'), ('categories', 'category')):
+        for event, op, row in (('INSERT', 'insert', 'new'), ('UPDATE', 'update', 'new'), ('DELETE', 'delete', 'old')):
+            db.execute('''
+                CREATE TRIGGER IF NOT EXISTS %s_change_%s AFTER %s ON %s BEGIN
+                    INSERT INTO change_log (entity, entity_id, op) VALUES ('%s', %s.id, '%s');
+                END
+            ''' % (table, op, event, table, entity, row, op))
+
+# Normalized condition: case and surrounding spaces don't matter, and a missing one means new
+CONDITION_KEY_SQL = "COALESCE(NULLIF(LOWER(TRIM(condition)), ''), 'new')"
+
+def normalize_condition(condition):
+    # The Python side of CONDITION_KEY_SQL, for filter values
+    return (condition or '').strip(' ').lower() or 'new'
+
+def migrate_category_ids(db):
+    # products.category_id references the category; products.category keeps its name
+    # for display and is renamed along with it. condition_key is what filters match on.
+    add_missing_columns(db, 'products', [
+        ('category_id', 'INTEGER REFERENCES categories(id)'),
+        ('condition_key', 'TEXT GENERATED ALWAYS AS (%s) VIRTUAL' % CONDITION_KEY_SQL),
+    ])
+    db.execute('UPDATE products SET category_id = (SELECT id FROM categories WHERE categories.name = products.category) WHERE category_id IS NULL')
+    db.execute('DROP INDEX IF EXISTS idx_products_category_id')
+    db.execute('DROP INDEX IF EXISTS idx_products_category_price_id')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_category_id_id ON products (category_id, id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_category_id_price_id ON products (category_id, price, id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_condition_key_id ON products (condition_key, id)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_condition_key_price_id ON products (condition_key, price, id)')
+    # Covers the /api/products/facets pass, so it reads the index instead of the table
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_category_id_condition_key_price ON products (category_id, condition_key, price)')
+
+def migrate_change_feed(db):
+    # Log the tables behind the admin lists too, for /api/changes. customer_stats
+    # changes show up as changes to the user with that phone number.
+    for table, entity in (('new_orders', 'order'), ('previews', 'preview'), ('users', 'user'), ('banners', 'banner')):
+        for event, op, row in (('INSERT', 'insert', 'new'), ('UPDATE', 'update', 'new'), ('DELETE', 'delete', 'old')):
+            db.execute('''
+                CREATE TRIGGER IF NOT EXISTS %s_change_%s AFTER %s ON %s BEGIN
+                    INSERT INTO change_log (entity, entity_id, op) VALUES ('%s', %s.id, '%s');
+                END
+            ''' % (table, op, event, table, entity, row, op))
+    for event, op in (('INSERT', 'insert'), ('UPDATE', 'update')):
         db.execute('''
-            CREATE TABLE IF NOT EXISTS previews (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_name TEXT NOT NULL,
-                user_phone TEXT NOT NULL,
-                preview_address TEXT NOT NULL,
-                schedule_date TEXT NOT NULL,
-                products TEXT NOT NULL,
-                status TEXT DEFAULT 'Pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        db.commit()
-
-        # Dummy data for delivered orders (for chart visualization)
-        # Ensure these dates are within a reasonable range for testing
-        dummy_orders = [
-            ('John Doe', '1234567890', '123 Main St', 'inside_dhaka', 'cod', None, 100.0, 80.0, 180.0, 'Delivered', '2024-01-15 10:00:00'),
-            ('Jane Smith', '0987654321', '456 Oak Ave', 'outside_dhaka', 'bkash', 'TRX123', 250.0, 150.0, 400.0, 'Delivered', '2024-01-20 11:30:00'),
-            ('John Doe', '1234567890', '123 Main St', 'inside_dhaka', 'cod', None, 50.0, 80.0, 130.0, 'Delivered', '2024-02-01 14:00:00'),
-            ('Peter Jones', '1122334455', '789 Pine Rd', 'inside_dhaka', 'cod', None, 300.0, 80.0, 380.0, 'Delivered', '2024-02-25 09:00:00'),
-            ('Jane Smith', '0987654321', '456 Oak Ave', 'outside_dhaka', 'cod', None, 120.0, 150.0, 270.0, 'Delivered', '2024-03-10 16:00:00'),
-            ('Alice Brown', '5566778899', '101 Elm St', 'inside_dhaka', 'bkash', 'TRX456', 80.0, 80.0, 160.0, 'Delivered', '2024-03-05 13:00:00'),
-            ('John Doe', '1234567890', '123 Main St', 'inside_dhaka', 'cod', None, 150.0, 80.0, 230.0, 'Delivered', '2024-04-01 10:00:00'),
-            ('Jane Smith', '0987654321', '456 Oak Ave', 'outside_dhaka', 'cod', None, 200.0, 150.0, 350.0, 'Delivered', '2024-04-15 11:30:00'),
-            ('Peter Jones', '1122334455', '789 Pine Rd', 'inside_dhaka', 'cod', None, 100.0, 80.0, 180.0, 'Delivered', '2024-05-01 14:00:00'),
-            ('Alice Brown', '5566778899', '101 Elm St', 'inside_dhaka', 'bkash', 'TRX789', 220.0, 80.0, 300.0, 'Delivered', '2024-05-20 09:00:00'),
-            ('John Doe', '1234567890', '123 Main St', 'inside_dhaka', 'cod', None, 90.0, 80.0, 170.0, 'Delivered', '2024-06-01 16:00:00'),
-            ('Jane Smith', '0987654321', '456 Oak Ave', 'outside_dhaka', 'cod', None, 180.0, 150.0, 330.0, 'Delivered', '2024-06-10 13:00:00'),
-            ('Peter Jones', '1122334455', '789 Pine Rd', 'inside_dhaka', 'cod', None, 250.0, 80.0, 330.0, 'Delivered', '2024-07-01 10:00:00'),
-            ('Alice Brown', '5566778899', '101 Elm St', 'inside_dhaka', 'bkash', 'TRX101', 130.0, 80.0, 210.0, 'Delivered', '2024-07-15 11:30:00'),
-            ('John Doe', '1234567890', '123 Main St', 'inside_dhaka', 'cod', None, 110.0, 80.0, 190.0, 'Delivered', '2024-08-01 14:00:00'),
-            ('Jane Smith', '0987654321', '456 Oak Ave', 'outside_dhaka', 'cod', None, 280.0, 150.0, 430.0, 'Delivered', '2024-08-05 09:00:00'),
-        ]
-        for order in dummy_orders:
-            try:
-                db.execute('INSERT INTO new_orders (customer_name, customer_phone, delivery_address, delivery_location, payment_method, bkash_trx_id, subtotal, delivery_charge, total, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', order)
-            except sqlite3.IntegrityError:
-                pass # Skip if order already exists
-
-        # Dummy data for previews (for chart visualization)
-        dummy_previews = [
-            ('John Doe', '1234567890', '123 Main St', '2024-01-18', 'Product A', 'Pending', '2024-01-10 10:00:00'),
-            ('Jane Smith', '0987654321', '456 Oak Ave', '2024-02-05', 'Product B', 'Confirmed', '2024-02-01 11:30:00'),
-            ('Peter Jones', '1122334455', '789 Pine Rd', '2024-02-28', 'Product C', 'Pending', '2024-02-20 14:00:00'),
-            ('Alice Brown', '5566778899', '101 Elm St', '2024-03-10', 'Product D', 'Completed', '2024-03-01 09:00:00'),
-            ('John Doe', '1234567890', '123 Main St', '2024-04-05', 'Product E', 'Pending', '2024-04-01 16:00:00'),
-            ('Jane Smith', '0987654321', '456 Oak Ave', '2024-05-15', 'Product F', 'Confirmed', '2024-05-10 13:00:00'),
-            ('Peter Jones', '1122334455', '789 Pine Rd', '2024-06-05', 'Product G', 'Pending', '2024-06-01 10:00:00'),
-            ('Alice Brown', '5566778899', '101 Elm St', '2024-07-20', 'Product H', 'Completed', '2024-07-10 11:30:00'),
-            ('John Doe', '1234567890', '123 Main St', '2024-08-10', 'Product I', 'Pending', '2024-08-01 14:00:00'),
-        ]
-        for preview in dummy_previews:
-            try:
-                db.execute('INSERT INTO previews (user_name, user_phone, preview_address, schedule_date, products, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)', preview)
-            except sqlite3.IntegrityError:
-                pass # Skip if preview already exists
+            CREATE TRIGGER IF NOT EXISTS customer_stats_change_%s AFTER %s ON customer_stats
+            WHEN EXISTS (SELECT 1 FROM users WHERE phone = new.phone) BEGIN
+                INSERT INTO change_log (entity, entity_id, op) SELECT 'user', id, 'update' FROM users WHERE phone = new.phone;
+            END
+        ''' % (op, event))
+
+MIGRATIONS = [
+    migrate_base_schema,
+    migrate_product_browsing,
+    migrate_order_indexes,
+    migrate_image_jobs,
+    migrate_dashboard_rollups,
+    migrate_order_listing_indexes,
+    migrate_customer_stats,
+    migrate_product_imports,
+    migrate_upload_refs,
+    migrate_change_log,
+    migrate_category_ids,
+    migrate_change_feed,
+]
 
+def init_db():
+    # Fast path: once the schema is current, startup is a single PRAGMA read
+    db = db_pool.acquire()
+    try:
+        if db.execute('PRAGMA user_version').fetchone()[0] >= len(MIGRATIONS):
+            return
+        # IMMEDIATE takes the write lock, so concurrently starting workers migrate once
+        db.execute('BEGIN IMMEDIATE')
+        version = db.execute('PRAGMA user_version').fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(db)
+            db.execute('PRAGMA user_version = %d' % number)
+        db.commit()
+    finally:
         db.close()
 
-# Initialize the database when the app starts
-init_db()
+# Demo data for the dashboard charts; loaded on demand with `flask --app app seed-demo-data`
+DEMO_ORDERS = [
+    ('John Doe', '1234567890', '123 Main St', 'inside_dhaka', 'cod', None, 100.0, 80.0, 180.0, 'Delivered', '2024-01-15 10:00:00'),
+    ('Jane Smith', '0987654321', '456 Oak Ave', 'outside_dhaka', 'bkash', 'TRX123', 250.0, 150.0, 400.0, 'Delivered', '2024-01-20 11:30:00'),
+    ('John Doe', '1234567890', '123 Main St', 'inside_dhaka', 'cod', None, 50.0, 80.0, 130.0, 'Delivered', '2024-02-01 14:00:00'),
+    ('Peter Jones', '1122334455', '789 Pine Rd', 'inside_dhaka', 'cod', None, 300.0, 80.0, 380.0, 'Delivered', '2024-02-25 09:00:00'),
+    ('Jane Smith', '0987654321', '456 Oak Ave', 'outside_dhaka', 'cod', None, 120.0, 150.0, 270.0, 'Delivered', '2024-03-10 16:00:00'),
+    ('Alice Brown', '5566778899', '101 Elm St', 'inside_dhaka', 'bkash', 'TRX456', 80.0, 80.0, 160.0, 'Delivered', '2024-03-05 13:00:00'),
+    ('John Doe', '1234567890', '123 Main St', 'inside_dhaka', 'cod', None, 150.0, 80.0, 230.0, 'Delivered', '2024-04-01 10:00:00'),
+    ('Jane Smith', '0987654321', '456 Oak Ave', 'outside_dhaka', 'cod', None, 200.0, 150.0, 350.0, 'Delivered', '2024-04-15 11:30:00'),
+    ('Peter Jones', '1122334455', '789 Pine Rd', 'inside_dhaka', 'cod', None, 100.0, 80.0, 180.0, 'Delivered', '2024-05-01 14:00:00'),
+    ('Alice Brown', '5566778899', '101 Elm St', 'inside_dhaka', 'bkash', 'TRX789', 220.0, 80.0, 300.0, 'Delivered', '2024-05-20 09:00:00'),
+    ('John Doe', '1234567890', '123 Main St', 'inside_dhaka', 'cod', None, 90.0, 80.0, 170.0, 'Delivered', '2024-06-01 16:00:00'),
+    ('Jane Smith', '0987654321', '456 Oak Ave', 'outside_dhaka', 'cod', None, 180.0, 150.0, 330.0, 'Delivered', '2024-06-10 13:00:00'),
+    ('Peter Jones', '1122334455', '789 Pine Rd', 'inside_dhaka', 'cod', None, 250.0, 80.0, 330.0, 'Delivered', '2024-07-01 10:00:00'),
+    ('Alice Brown', '5566778899', '101 Elm St', 'inside_dhaka', 'bkash', 'TRX101', 130.0, 80.0, 210.0, 'Delivered', '2024-07-15 11:30:00'),
+    ('John Doe', '1234567890', '123 Main St', 'inside_dhaka', 'cod', None, 110.0, 80.0, 190.0, 'Delivered', '2024-08-01 14:00:00'),
+    ('Jane Smith', '0987654321', '456 Oak Ave', 'outside_dhaka', 'cod', None, 280.0, 150.0, 430.0, 'Delivered', '2024-08-05 09:00:00'),
+]
+DEMO_PREVIEWS = [
+    ('John Doe', '1234567890', '123 Main St', '2024-01-18', 'Product A', 'Pending', '2024-01-10 10:00:00'),
+    ('Jane Smith', '0987654321', '456 Oak Ave', '2024-02-05', 'Product B', 'Confirmed', '2024-02-01 11:30:00'),
+    ('Peter Jones', '1122334455', '789 Pine Rd', '2024-02-28', 'Product C', 'Pending', '2024-02-20 14:00:00'),
+    ('Alice Brown', '5566778899', '101 Elm St', '2024-03-10', 'Product D', 'Completed', '2024-03-01 09:00:00'),
+    ('John Doe', '1234567890', '123 Main St', '2024-04-05', 'Product E', 'Pending', '2024-04-01 16:00:00'),
+    ('Jane Smith', '0987654321', '456 Oak Ave', '2024-05-15', 'Product F', 'Confirmed', '2024-05-10 13:00:00'),
+    ('Peter Jones', '1122334455', '789 Pine Rd', '2024-06-05', 'Product G', 'Pending', '2024-06-01 10:00:00'),
+    ('Alice Brown', '5566778899', '101 Elm St', '2024-07-20', 'Product H', 'Completed', '2024-07-10 11:30:00'),
+    ('John Doe', '1234567890', '123 Main St', '2024-08-10', 'Product I', 'Pending', '2024-08-01 14:00:00'),
+]
+
+@api.cli.command('seed-demo-data')
+def seed_demo_data_command():
+    """Insert the demo orders and previews used by the dashboard charts (idempotent)."""
+    init_db()
+    db = db_pool.acquire()
+    added = 0
+    for order in DEMO_ORDERS:
+        cursor = db.execute('INSERT INTO new_orders (customer_name, customer_phone, delivery_address, delivery_location, payment_method, bkash_trx_id, subtotal, delivery_charge, total, status, created_at) SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM new_orders WHERE customer_name = ? AND customer_phone = ? AND created_at = ? AND total = ?)', order + (order[0], order[1], order[10], order[8]))
+        added += cursor.rowcount
+    for preview in DEMO_PREVIEWS:
+        cursor = db.execute('INSERT INTO previews (user_name, user_phone, preview_address, schedule_date, products, status, created_at) SELECT ?, ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM previews WHERE user_name = ? AND user_phone = ? AND created_at = ? AND products = ?)', preview + (preview[0], preview[1], preview[6], preview[4]))
+        added += cursor.rowcount
+    rebuild_rollups(db)
+    rebuild_customer_stats(db)
+    db.commit()
+    db.close()
+    print('Seeded %d demo rows.' % added)
+
+@api.cli.command('backfill-stats')
+def backfill_stats_command():
+    """Recompute the dashboard rollups and customer stats from new_orders and previews."""
+    init_db()
+    db = db_pool.acquire()
+    db.execute('BEGIN IMMEDIATE')
+    rebuild_rollups(db)
+    rebuild_customer_stats(db)
+    db.commit()
+    db.close()
+    print('Dashboard rollups and customer stats rebuilt.')
+
 
 # API Endpoints
 
 # Products
-@app.route('/api/products', methods=['GET'])
+# Response cache for catalog reads. Entries are keyed on path + query string and
+# tagged with the generation they were built in; catalog writes bump the generation,
+# which invalidates every entry at once. Each worker keeps its own cache, so the TTL
+# bounds how long another worker can serve a pre-write response.
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_TTL = 60
+RESPONSE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+class ResponseCache:
+    def __init__(self, size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry['generation'] != self.generation or entry['expires'] < time.monotonic():
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, generation, body, mimetype):
+        entry = {
+            'generation': generation,
+            'expires': time.monotonic() + self.ttl,
+            'body': body,
+            'mimetype': mimetype,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'encoded': {}, # encoding -> compressed body, filled in as clients ask
+        }
+        with self.lock:
+            # A write landed while this response was being built; don't cache it
+            if generation != self.generation:
+                return entry
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return entry
+
+    def bump(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "generation": self.generation, "hits": self.hits, "misses": self.misses}
+
+response_cache = ResponseCache()
+
+def cached_response(view):
+    # Serve a GET view from the response cache with a strong ETag; a matching
+    # If-None-Match gets a 304 without running the view.
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.full_path
+        entry = response_cache.get(key)
+        if entry is None:
+            generation = response_cache.generation
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            entry = response_cache.put(key, generation, response.get_data(), response.mimetype)
+        encoding = choose_encoding(entry['mimetype'], len(entry['body']))
+        if request.if_none_match.contains_weak(entry['etag']):
+            response = Response(status=304)
+        elif encoding:
+            if encoding not in entry['encoded']:
+                entry['encoded'][encoding] = encode_body(entry['body'], encoding)
+            response = Response(entry['encoded'][encoding], mimetype=entry['mimetype'])
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = Response(entry['body'], mimetype=entry['mimetype'])
+        # An encoded body only matches the content's ETag weakly
+        response.set_etag(entry['etag'], weak=encoding is not None)
+        response.headers['Cache-Control'] = RESPONSE_CACHE_CONTROL
+        return response
+    return wrapper
+
+# Keyset pagination: each ordering pages on a (sort key, id) pair that an index covers.
+# Values are (ORDER BY clause, row-value comparison for rows after the cursor, cursor key columns)
+PRODUCT_ORDERINGS = {
+    'newest': (' ORDER BY products.id DESC', 'products.id < ?', ('id',)),
+    'price_asc': (' ORDER BY products.price ASC, products.id ASC', '(products.price, products.id) > (?, ?)', ('price', 'id')),
+    'price_desc': (' ORDER BY products.price DESC, products.id DESC', '(products.price, products.id) < (?, ?)', ('price', 'id')),
+}
+MAX_PER_PAGE = 100
+
+# Cached product counts per filter, so page N doesn't re-count the table each time
+PRODUCT_COUNT_TTL = 30
+PRODUCT_COUNT_CACHE_SIZE = 256
+product_count_cache = {}
+
+def count_products(conn, count_query, params):
+    key = (count_query, tuple(params))
+    cached = product_count_cache.get(key)
+    if cached and time.monotonic() - cached[1] < PRODUCT_COUNT_TTL:
+        return cached[0]
+    total = conn.execute(count_query, params).fetchone()[0]
+    if len(product_count_cache) >= PRODUCT_COUNT_CACHE_SIZE:
+        product_count_cache.clear()
+    product_count_cache[key] = (total, time.monotonic())
+    return total
+
+def invalidate_catalog():
+    # Call after any write to products, categories or banners
+    response_cache.bump()
+    product_count_cache.clear()
+    catalog.stale = True
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+def decode_product_cursor(cursor, count):
+    # Product cursors are count numbers ending in an integer (an id, or a relevance offset)
+    values = decode_cursor(cursor)
+    if (values is None or len(values) != count
+            or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values)
+            or not isinstance(values[-1], int)):
+        return None
+    return values
+
+# Columns a client may ask for with fields=; id is always returned
+PRODUCT_FIELDS = ('id', 'name', 'description', 'price', 'offer_price', 'image', 'category', 'category_id', 'colors', 'condition', 'product_code', 'quantity')
+# category_id follows the category name; ?6 is the category parameter
+PRODUCT_INSERT_SQL = ('INSERT INTO products (name, description, price, offer_price, image, category, colors, condition, product_code, quantity, category_id) '
+                      'VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, (SELECT id FROM categories WHERE name = ?6))')
+# Computed fields that can be asked for with fields=; cover_image is the first image, for grid cards
+PRODUCT_COMPUTED_FIELDS = {
+    'cover_image': "CASE WHEN INSTR(products.image, ',') > 0 THEN SUBSTR(products.image, 1, INSTR(products.image, ',') - 1) ELSE products.image END",
+}
+MAX_BATCH_IDS = 100
+
+# List endpoints have SQLite encode each row with json_object() and join the rows
+# into the response body, instead of copying every row into a dict for jsonify.
+def product_json_sql(columns, snippet=False):
+    pairs = ["'%s', %s" % (column, PRODUCT_COMPUTED_FIELDS.get(column, 'products.' + column)) for column in columns]
+    if snippet:
+        pairs.append("'snippet', " + SEARCH_SNIPPET)
+    return 'json_object(%s)' % ', '.join(pairs)
+
+def json_data_response(data_json, **fields):
+    # data_json is an already encoded JSON array; fields are the rest of the envelope
+    envelope = current_app.json.dumps(fields)
+    return Response('{"data":%s,%s' % (data_json, envelope[1:]), mimetype='application/json')
+
+class FastJSONProvider(DefaultJSONProvider):
+    # jsonify through orjson when it's installed; anything it can't handle falls back.
+    # response() always passes compact separators (indent=2 in debug mode), which orjson
+    # writes natively. Its output keeps insertion order and leaves UTF-8 unescaped.
+    def dumps(self, obj, **kwargs):
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            unhandled = dict(kwargs)
+            if tuple(unhandled.get('separators', ())) == (',', ':'):
+                del unhandled['separators']
+            if unhandled.get('indent') == 2:
+                del unhandled['indent']
+                option |= orjson.OPT_INDENT_2
+            if not unhandled:
+                try:
+                    return orjson.dumps(obj, option=option).decode()
+                except TypeError:
+                    pass
+        return super().dumps(obj, **kwargs)
+
+def parse_fields(fields, allowed):
+    # Accepts "a,b" or ["a", "b"]; returns the column list, or None if a name is unknown
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    fields = [field.strip() for field in fields if field.strip()]
+    if any(field not in allowed for field in fields):
+        return None
+    return ['id'] + [field for field in fields if field != 'id']
+
+def lookup_products(ids, fields):
+    # Resolve many products with one primary-key query, keeping the request order.
+    # Unknown ids come back as null entries and are listed in "missing".
+    try:
+        ids = [int(product_id) for product_id in ids if str(product_id).strip()]
+    except (TypeError, ValueError):
+        return jsonify({"error": "ids must be integers"}), 400
+    if not ids or len(ids) > MAX_BATCH_IDS:
+        return jsonify({"error": "Between 1 and %d ids are required" % MAX_BATCH_IDS}), 400
+    columns = parse_fields(fields, PRODUCT_FIELDS + tuple(PRODUCT_COMPUTED_FIELDS)) if fields else list(PRODUCT_FIELDS)
+    if columns is None:
+        return jsonify({"error": "Unknown field requested"}), 400
+
+    unique_ids = list(dict.fromkeys(ids))
+    conn = get_db_connection()
+    rows = conn.execute('SELECT products.id, %s FROM products WHERE id IN (%s)' % (product_json_sql(columns), ', '.join('?' * len(unique_ids))), unique_ids).fetchall()
+    conn.close()
+    found = {row[0]: row[1] for row in rows}
+    return json_data_response('[%s]' % ','.join(found.get(product_id, 'null') for product_id in ids),
+                              message="success", missing=[product_id for product_id in unique_ids if product_id not in found])
+
+# In-memory catalog: answers /api/products category/condition/sort/page/cursor queries,
+# and /api/products/facets without a search, without SQLite. Product columns are stored by slot, with per-category and
+# per-condition posting lists kept sorted by id and by (price, id). Searches and ?ids=
+# still go to SQLite. The index syncs from change_log: right after this worker's
+# writes (invalidate_catalog marks it stale) and at most CATALOG_SYNC_INTERVAL seconds
+# after another worker's. ?engine=sql forces the SQL path; `flask --app app
+# check-catalog` compares the two.
+CATALOG_SYNC_INTERVAL = 1.0
+CATALOG_REBUILD_CHANGES = 5000 # past this many changes a full rebuild is cheaper
+ALL_PRODUCTS = object()
+
+class PostingList:
+    # The products matching one filter value, in id order and in (price, id) order
+    def __init__(self):
+        self.ids = array('q')
+        self.by_price = array('q')
+
+    def add(self, product_id, price_key):
+        bisect.insort(self.ids, product_id)
+        bisect.insort(self.by_price, product_id, key=price_key)
+
+    def remove(self, product_id, price_key):
+        del self.ids[bisect.bisect_left(self.ids, product_id)]
+        del self.by_price[bisect.bisect_left(self.by_price, price_key(product_id), key=price_key)]
+
+class CatalogIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.stale = True
+        self.synced_at = 0.0
+        self.seq = 0
+        self.category_names = {}
+
+    def reset(self):
+        self.slots = {} # product id -> slot in the column arrays
+        self.free_slots = []
+        self.price = array('d')
+        self.columns = {field: [] for field in CATALOG_FIELDS if field not in ('id', 'price')}
+        self.postings = {ALL_PRODUCTS: PostingList()}
+
+    def price_key(self, product_id):
+        return (self.price[self.slots[product_id]], product_id)
+
+    def filter_key(self, category_id, condition_key):
+        key = ()
+        if category_id is not None:
+            key += ('category', category_id)
+        if condition_key is not None:
+            key += ('condition', condition_key)
+        return key or ALL_PRODUCTS
+
+    def posting_keys(self, slot):
+        # Every product is in up to four lists, so any filter combination is a single list
+        category_id = self.columns['category_id'][slot]
+        condition_key = self.columns['condition_key'][slot]
+        if category_id is None:
+            return (ALL_PRODUCTS, self.filter_key(None, condition_key))
+        return (ALL_PRODUCTS, self.filter_key(category_id, None), self.filter_key(None, condition_key), self.filter_key(category_id, condition_key))
+
+    def add(self, row):
+        product_id = row['id']
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.price[slot] = row['price']
+            for field, column in self.columns.items():
+                column[slot] = row[field]
+        else:
+            slot = len(self.price)
+            self.price.append(row['price'])
+            for field, column in self.columns.items():
+                column.append(row[field])
+        self.slots[product_id] = slot
+        for key in self.posting_keys(slot):
+            if key not in self.postings:
+                self.postings[key] = PostingList()
+            self.postings[key].add(product_id, self.price_key)
+
+    def remove(self, product_id):
+        slot = self.slots[product_id]
+        for key in self.posting_keys(slot):
+            posting = self.postings[key]
+            posting.remove(product_id, self.price_key)
+            if not posting.ids and key is not ALL_PRODUCTS:
+                del self.postings[key]
+        del self.slots[product_id]
+        for column in self.columns.values():
+            column[slot] = None
+        self.free_slots.append(slot)
+
+    def rebuild(self, conn):
+        self.reset()
+        rows = conn.execute('SELECT %s FROM products ORDER BY id' % ', '.join(CATALOG_FIELDS)).fetchall()
+        self.price = array('d', (row['price'] for row in rows))
+        for field, column in self.columns.items():
+            column.extend(row[field] for row in rows)
+        self.slots = {row['id']: slot for slot, row in enumerate(rows)}
+        # Group ids per posting list, then sort each once instead of inserting one by one
+        grouped = {}
+        for slot, row in enumerate(rows):
+            for key in self.posting_keys(slot):
+                grouped.setdefault(key, []).append(slot)
+        ids = [row['id'] for row in rows]
+        price_order = sorted(range(len(rows)), key=lambda slot: (self.price[slot], ids[slot]))
+        rank = array('q', bytes(8 * len(rows)))
+        for position, slot in enumerate(price_order):
+            rank[slot] = position
+        for key, slots in grouped.items():
+            posting = self.postings.setdefault(key, PostingList())
+            posting.ids = array('q', (ids[slot] for slot in slots))
+            posting.by_price = array('q', (ids[slot] for slot in sorted(slots, key=rank.__getitem__)))
+
+    def sync(self):
+        with self.lock:
+            conn = db_pool.acquire()
+            try:
+                # One read transaction, so the products we load match the change_log position
+                conn.execute('BEGIN')
+                latest = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+                changes = None
+                if not self.loaded or latest < self.seq:
+                    self.rebuild(conn)
+                    self.category_names = {row['id']: row['name'] for row in conn.execute('SELECT id, name FROM categories ORDER BY id')}
+                elif latest != self.seq:
+                    # Orders, users and the like share the log; only catalog writes matter here
+                    changes = conn.execute("SELECT entity, entity_id FROM change_log WHERE seq > ? AND seq <= ? AND entity IN ('product', 'category', 'banner')", (self.seq, latest)).fetchall()
+                    if len(changes) > CATALOG_REBUILD_CHANGES:
+                        self.rebuild(conn)
+                    else:
+                        self.apply_product_changes(conn, {row['entity_id'] for row in changes if row['entity'] == 'product'})
+                    if any(row['entity'] == 'category' for row in changes):
+                        self.category_names = {row['id']: row['name'] for row in conn.execute('SELECT id, name FROM categories ORDER BY id')}
+                if not self.loaded or latest < self.seq or changes:
+                    # Another worker's writes also make this worker's cached responses stale
+                    response_cache.bump()
+                    product_count_cache.clear()
+                conn.rollback()
+            finally:
+                conn.close()
+            self.seq = latest
+            self.loaded = True
+            self.stale = False
+            self.synced_at = time.monotonic()
+
+    def sync_if_due(self):
+        if self.stale or time.monotonic() - self.synced_at > CATALOG_SYNC_INTERVAL:
+            self.sync()
+
+    def apply_product_changes(self, conn, product_ids):
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), 500):
+            chunk = product_ids[start:start + 500]
+            rows = {row['id']: row for row in conn.execute('SELECT %s FROM products WHERE id IN (%s)' % (', '.join(CATALOG_FIELDS), ', '.join('?' * len(chunk))), chunk)}
+            for product_id in chunk:
+                if product_id in self.slots:
+                    self.remove(product_id)
+                if product_id in rows:
+                    self.add(rows[product_id])
+
+    def query(self, args):
+        # Returns a response, or None when the request needs the SQL path
+        if 'search' in args and build_search_match(args['search']) or 'engine' in args:
+            return None
+        page = args.get('page', 1, type=int)
+        per_page = min(max(args.get('per_page', 10, type=int), 1), MAX_PER_PAGE)
+        use_cursor = 'cursor' in args
+        cursor_values = None
+        ordering = args.get('sort') if args.get('sort') in PRODUCT_ORDERINGS else 'newest'
+        if use_cursor and args['cursor']:
+            cursor_values = decode_product_cursor(args['cursor'], len(PRODUCT_ORDERINGS[ordering][2]))
+            if cursor_values is None:
+                return None
+        elif not use_cursor and page < 1:
+            return None
+        columns = list(PRODUCT_FIELDS)
+        if args.get('fields'):
+            columns = parse_fields(args['fields'], PRODUCT_FIELDS + tuple(PRODUCT_COMPUTED_FIELDS))
+            if columns is None:
+                return None
+
+        category_id = args.get('category_id')
+        if category_id and category_id != 'all':
+            try:
+                category_id = int(category_id)
+            except ValueError:
+                return None
+        else:
+            category_id = None
+        condition_key = normalize_condition(args['condition']) if args.get('condition') else None
+
+        with self.lock:
+            self.sync_if_due()
+            if category_id is not None and category_id not in self.category_names:
+                if use_cursor:
+                    return jsonify({"message": "success", "data": [], "next_cursor": None})
+                return jsonify({"message": "success", "data": [], "total_pages": 0, "current_page": page})
+            posting = self.postings.get(self.filter_key(category_id, condition_key), PostingList())
+
+            # Walk the posting list in the requested order, from the cursor on
+            if ordering == 'newest':
+                values = posting.ids
+                end = bisect.bisect_left(values, cursor_values[0]) if cursor_values else len(values)
+                positions = range(end - 1, -1, -1)
+            elif ordering == 'price_asc':
+                values = posting.by_price
+                start = bisect.bisect_right(values, tuple(cursor_values), key=self.price_key) if cursor_values else 0
+                positions = range(start, len(values))
+            else:
+                values = posting.by_price
+                end = bisect.bisect_left(values, tuple(cursor_values), key=self.price_key) if cursor_values else len(values)
+                positions = range(end - 1, -1, -1)
+            offset = 0 if use_cursor else (page - 1) * per_page
+            limit = per_page + 1 if use_cursor else per_page
+            page_ids = [values[i] for i in positions[offset:offset + limit]]
+            total_products = len(posting.ids)
+
+            next_cursor = None
+            if use_cursor and len(page_ids) > per_page:
+                page_ids = page_ids[:per_page]
+                last = page_ids[-1]
+                next_cursor = encode_cursor([last] if ordering == 'newest' else [self.price[self.slots[last]], last])
+            data = [self.row_data(product_id, columns) for product_id in page_ids]
+
+        if use_cursor:
+            response = {"message": "success", "data": data, "next_cursor": next_cursor, "per_page": per_page}
+            if args.get('include_total', '').lower() in ('1', 'true', 'yes'):
+                response["total_products"] = total_products
+                response["total_pages"] = (total_products + per_page - 1) // per_page
+            return jsonify(response)
+        return jsonify({"message": "success", "data": data, "total_pages": (total_products + per_page - 1) // per_page, "current_page": page, "total_products": total_products})
+
+    def facets(self, category_id, condition_key):
+        # Same counts as the SQL pass in get_product_facets, read off the posting lists
+        with self.lock:
+            self.sync_if_due()
+            category_counts = {}
+            condition_counts = {}
+            for key, posting in self.postings.items():
+                if key is ALL_PRODUCTS:
+                    continue
+                fields = dict(zip(key[::2], key[1::2]))
+                if 'category' in fields and fields.get('condition') == condition_key:
+                    category_counts[fields['category']] = len(posting.ids)
+                if 'condition' in fields and fields.get('category') == category_id:
+                    condition_counts[fields['condition']] = len(posting.ids)
+            posting = self.postings.get(self.filter_key(category_id, condition_key), PostingList())
+            # by_price is in (price, id) order, so each bucket edge is one binary search
+            edges = [bisect.bisect_left(posting.by_price, (edge, float('-inf')), key=self.price_key) for edge in PRICE_FACET_EDGES]
+            price_counts = [end - start for start, end in zip([0] + edges, edges + [len(posting.by_price)])]
+            return facet_data(self.category_names, category_counts, condition_counts, price_counts)
+
+    def row_data(self, product_id, columns):
+        slot = self.slots[product_id]
+        data = {}
+        for column in columns:
+            if column == 'id':
+                data['id'] = product_id
+            elif column == 'price':
+                data['price'] = self.price[slot]
+            elif column == 'cover_image':
+                image = self.columns['image'][slot]
+                data['cover_image'] = image.split(',', 1)[0] if image else image
+            else:
+                data[column] = self.columns[column][slot]
+        return data
+
+# The index also keeps the normalized condition each posting list is keyed on
+CATALOG_FIELDS = PRODUCT_FIELDS + ('condition_key',)
+catalog = CatalogIndex()
+
+@api.cli.command('check-catalog')
+def check_catalog_command():
+    """Compare in-memory catalog responses with the SQL path for every filter and sort."""
+    init_db()
+    client = current_app.test_client()
+    conn = db_pool.acquire()
+    category_ids = [str(row['id']) for row in conn.execute('SELECT id FROM categories')] + ['all', '999999']
+    conditions = [row[0] for row in conn.execute('SELECT DISTINCT condition_key FROM products')] + ['New', 'none']
+    conn.close()
+    checked = 0
+    mismatches = []
+    for category_id, condition, sort in itertools.product([None] + category_ids, [None] + conditions, [None] + list(PRODUCT_ORDERINGS)):
+        params = {'category_id': category_id, 'condition': condition, 'sort': sort}
+        base = '/api/products?' + '&'.join('%s=%s' % (name, value) for name, value in params.items() if value is not None)
+        queries = [base + '&page=1', base + '&page=2&per_page=5', base + '&page=3&per_page=7&fields=id,price,cover_image']
+        # Follow cursors for a few pages, taking each next page from the engine's own response
+        cursor = ''
+        for _ in range(3):
+            query = base + '&per_page=4&include_total=1&cursor=' + cursor
+            queries.append(query)
+            cursor = client.get(query).get_json().get('next_cursor')
+            if not cursor:
+                break
+        if sort is None:
+            queries.append(base.replace('/api/products?', '/api/products/facets?'))
+        for query in queries:
+            engine, sql = client.get(query).get_json(), client.get(query + '&engine=sql').get_json()
+            checked += 1
+            if engine != sql:
+                mismatches.append(query)
+    for query in mismatches:
+        print('mismatch: ' + query)
+    print('Checked %d queries, %d mismatches.' % (checked, len(mismatches)))
+
+@api.route('/api/products/batch', methods=['POST'])
+def get_products_batch():
+    data = request.get_json(silent=True) or {}
+    return lookup_products(data.get('ids') or [], data.get('fields'))
+
+@api.route('/api/products', methods=['GET'])
+@cached_response
 def get_products():
+    # ?ids=1,2,3 is a batch lookup for carts and orders, not a catalog page
+    if 'ids' in request.args:
+        return lookup_products(request.args['ids'].split(','), request.args.get('fields'))
+    if current_app.config['CATALOG_ENGINE']:
+        response = catalog.query(request.args)
+        if response is not None:
+            return response
+
     conn = get_db_connection()
     category_id = request.args.get('category_id')
     sort_option = request.args.get('sort')
     search_query = request.args.get('search')
     condition = request.args.get('condition')
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), MAX_PER_PAGE)
+    # Passing cursor (empty for the first page) switches to keyset pagination
+    use_cursor = 'cursor' in request.args
+    cursor = request.args.get('cursor', '')
+    include_total = request.args.get('include_total', '').lower() in ('1', 'true', 'yes')
+    # fields=id,name,price,cover_image trims grid payloads to what the cards show
+    columns = list(PRODUCT_FIELDS)
+    if request.args.get('fields'):
+        columns = parse_fields(request.args['fields'], PRODUCT_FIELDS + tuple(PRODUCT_COMPUTED_FIELDS))
+        if columns is None:
+            conn.close()
+            return jsonify({"error": "Unknown field requested"}), 400
 
-    query = 'SELECT * FROM products'
+    # Each row is its JSON text plus the sort keys the next cursor is built from
+    query = 'SELECT %s, products.price, products.id FROM products' % product_json_sql(columns)
     count_query = 'SELECT COUNT(*) FROM products'
     params = []
     where_clauses = []
 
+    search_match = build_search_match(search_query) if search_query else ''
+    if search_match:
+        query = 'SELECT %s, products.price, products.id FROM products_fts JOIN products ON products.id = products_fts.rowid' % product_json_sql(columns, snippet=True)
+        count_query = 'SELECT COUNT(*) FROM products_fts JOIN products ON products.id = products_fts.rowid'
+        where_clauses.append('products_fts MATCH ?')
+        params.append(search_match)
+
     if category_id and category_id != 'all':
-        category_row = conn.execute('SELECT name FROM categories WHERE id = ?', (category_id,)).fetchone()
-        if category_row:
-            category_name = category_row['name']
-            where_clauses.append('category = ?')
-            params.append(category_name)
+        if conn.execute('SELECT 1 FROM categories WHERE id = ?', (category_id,)).fetchone():
+            where_clauses.append('products.category_id = ?')
+            params.append(category_id)
         else:
             conn.close()
+            if use_cursor:
+                return jsonify({"message": "success", "data": [], "next_cursor": None})
             return jsonify({"message": "success", "data": [], "total_pages": 0, "current_page": page})
 
-    if search_query:
-        search_pattern = '%' + search_query + '%'
-        where_clauses.append('(name LIKE ? OR description LIKE ?)')
-        params.append(search_pattern)
-        params.append(search_pattern)
-
     if condition:
-        if condition.lower() == 'new':
-            where_clauses.append("(LOWER(condition) = ? OR condition IS NULL)")
-            params.append('new')
-        else:
-            where_clauses.append("LOWER(condition) = ?")
-            params.append(condition.lower())
-
+        where_clauses.append('products.condition_key = ?')
+        params.append(normalize_condition(condition))
+
+    # Default sort order: relevance when searching, newest first otherwise
+    ordering = sort_option if sort_option in PRODUCT_ORDERINGS else 'newest'
+    order_by_clause, after_cursor_clause, cursor_columns = PRODUCT_ORDERINGS[ordering]
+    # Relevance isn't an indexed column, so its cursor carries an offset into the match set
+    by_relevance = bool(search_match) and ordering == 'newest'
+    if by_relevance:
+        order_by_clause = ' ORDER BY ' + SEARCH_RANK + ', products.id DESC'
+
+    filter_params = list(params)
     if where_clauses:
-        query += ' WHERE ' + ' AND '.join(where_clauses)
         count_query += ' WHERE ' + ' AND '.join(where_clauses)
 
-    # Default sort order
-    order_by_clause = ' ORDER BY id DESC'
+    offset = (page - 1) * per_page
+    if use_cursor and cursor:
+        cursor_values = decode_product_cursor(cursor, 1 if by_relevance else len(cursor_columns))
+        if cursor_values is None or by_relevance and cursor_values[0] < 0:
+            conn.close()
+            return jsonify({"error": "Invalid cursor"}), 400
+        if by_relevance:
+            offset = cursor_values[0]
+        else:
+            where_clauses.append(after_cursor_clause)
+            params.extend(cursor_values)
+    elif use_cursor:
+        offset = 0
 
-    if sort_option == 'price_asc':
-        order_by_clause = ' ORDER BY price ASC'
-    elif sort_option == 'price_desc':
-        order_by_clause = ' ORDER BY price DESC'
-    
+    if where_clauses:
+        query += ' WHERE ' + ' AND '.join(where_clauses)
     query += order_by_clause
 
+    if use_cursor:
+        # Fetch one extra row to learn whether another page exists
+        query += ' LIMIT ?'
+        params.append(per_page + 1)
+        if by_relevance:
+            query += ' OFFSET ?'
+            params.append(offset)
+        rows = conn.execute(query, params).fetchall()
+        products = rows[:per_page]
+        next_cursor = None
+        if len(rows) > per_page:
+            last = products[-1]
+            next_cursor = encode_cursor([offset + per_page] if by_relevance else [last[column] for column in cursor_columns])
+        response = {"message": "success", "next_cursor": next_cursor, "per_page": per_page}
+        if include_total:
+            total_products = count_products(conn, count_query, filter_params)
+            response["total_products"] = total_products
+            response["total_pages"] = (total_products + per_page - 1) // per_page
+        conn.close()
+        return json_data_response('[%s]' % ','.join(row[0] for row in products), **response)
+
     # Get total count for pagination
-    total_products = conn.execute(count_query, params).fetchone()[0]
+    total_products = count_products(conn, count_query, filter_params)
     total_pages = (total_products + per_page - 1) // per_page
 
     # Add LIMIT and OFFSET for pagination
     query += ' LIMIT ? OFFSET ?'
     params.append(per_page)
-    params.append((page - 1) * per_page)
+    params.append(offset)
 
     products = conn.execute(query, params).fetchall()
     conn.close()
-    return jsonify({"message": "success", "data": [dict(row) for row in products], "total_pages": total_pages, "current_page": page, "total_products": total_products})
+    return json_data_response('[%s]' % ','.join(row[0] for row in products), message="success", total_pages=total_pages, current_page=page, total_products=total_products)
+
+# Filter sidebar counts for the current search. Each facet ignores its own filter, so
+# the sidebar can show what picking another category or condition would give.
+# Price ranges are [min, max) in taka; the last one has no upper bound.
+PRICE_FACET_EDGES = (5000, 10000, 25000, 50000, 100000, 200000)
+
+def facet_data(category_names, category_counts, condition_counts, price_counts):
+    bounds = (0,) + PRICE_FACET_EDGES + (None,)
+    return {
+        "total": sum(price_counts),
+        "categories": [{"id": category_id, "name": name, "count": category_counts.get(category_id, 0)} for category_id, name in category_names.items()],
+        "conditions": [{"condition": condition, "count": count} for condition, count in sorted(condition_counts.items(), key=lambda item: (-item[1], item[0])) if count],
+        "price_ranges": [{"min": bounds[i], "max": bounds[i + 1], "count": count} for i, count in enumerate(price_counts)],
+    }
+
+@api.route('/api/products/facets', methods=['GET'])
+@cached_response
+def get_product_facets():
+    category_id = request.args.get('category_id')
+    if category_id and category_id != 'all':
+        try:
+            category_id = int(category_id)
+        except ValueError:
+            return jsonify({"error": "category_id must be an integer"}), 400
+    else:
+        category_id = None
+    condition_key = normalize_condition(request.args['condition']) if request.args.get('condition') else None
+    search_match = build_search_match(request.args.get('search', ''))
+    if current_app.config['CATALOG_ENGINE'] and not search_match and 'engine' not in request.args:
+        return jsonify({"message": "success", "data": catalog.facets(category_id, condition_key)})
+
+    # One grouped pass over the matching products; the facets are sums over its rows
+    price_bucket = 'CASE %s ELSE %d END' % (' '.join('WHEN products.price < %d THEN %d' % (edge, i) for i, edge in enumerate(PRICE_FACET_EDGES)), len(PRICE_FACET_EDGES))
+    query = 'SELECT products.category_id, products.condition_key, %s, COUNT(*) FROM products' % price_bucket
+    params = []
+    if search_match:
+        query += ' JOIN products_fts ON products.id = products_fts.rowid WHERE products_fts MATCH ?'
+        params.append(search_match)
+    conn = get_db_connection()
+    rows = conn.execute(query + ' GROUP BY 1, 2, 3', params).fetchall()
+    category_names = {row['id']: row['name'] for row in conn.execute('SELECT id, name FROM categories ORDER BY id')}
+    conn.close()
 
-@app.route('/api/products', methods=['POST'])
+    category_counts = {}
+    condition_counts = {}
+    price_counts = [0] * (len(PRICE_FACET_EDGES) + 1)
+    for row_category_id, row_condition_key, bucket, count in rows:
+        in_category = category_id is None or row_category_id == category_id
+        in_condition = condition_key is None or row_condition_key == condition_key
+        if in_condition:
+            category_counts[row_category_id] = category_counts.get(row_category_id, 0) + count
+        if in_category:
+            condition_counts[row_condition_key] = condition_counts.get(row_condition_key, 0) + count
+        if in_category and in_condition:
+            price_counts[bucket] += count
+    return jsonify({"message": "success", "data": facet_data(category_names, category_counts, condition_counts, price_counts)})
+
+@api.route('/api/products', methods=['POST'])
 def add_product():
     name = request.form['name']
     description = request.form.get('description')
@@ -301,33 +1858,29 @@ def add_product():
         files = request.files.getlist('images')
         if len(files) > 5:
             return jsonify({"error": "Maximum 5 images allowed"}), 400
-        for file in files:
-            if file.filename != '':
-                filename = str(uuid.uuid4()) + os.path.splitext(file.filename)[1] # Generate unique filename
-                temp_path = os.path.join(app.config['UPLOAD_FOLDER'], "temp_" + filename)
-                file.save(temp_path)
-                resize_image(temp_path, os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                os.remove(temp_path) # Remove temporary file
-                image_filenames.append(filename)
+        image_filenames = queue_images(files)
     image_paths = ', '.join(image_filenames) # Store as comma-separated string
 
     conn = get_db_connection()
-    cursor = conn.execute('INSERT INTO products (name, description, price, offer_price, image, category, colors, condition, product_code, quantity) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (name, description, price, offer_price, image_paths, category, colors, condition, product_code, quantity))
+    cursor = conn.execute(PRODUCT_INSERT_SQL, (name, description, price, offer_price, image_paths, category, colors, condition, product_code, quantity))
+    add_upload_refs(conn, image_filenames)
     conn.commit()
+    invalidate_catalog()
     product_id = cursor.lastrowid
     conn.close()
-    return jsonify({"message": "success", "data": {'id': product_id, 'name': name, 'description': description, 'price': price, 'offer_price': offer_price, 'image': image_paths, 'category': category, 'colors': colors, 'condition': condition, 'product_code': product_code, 'quantity': quantity}}), 201
+    return jsonify({"message": "success", "data": {'id': product_id, 'name': name, 'description': description, 'price': price, 'offer_price': offer_price, 'image': image_paths, 'category': category, 'colors': colors, 'condition': condition, 'product_code': product_code, 'quantity': quantity}, "pending_images": image_filenames}), 201
 
-@app.route('/api/products/<int:product_id>', methods=['GET'])
+@api.route('/api/products/<int:product_id>', methods=['GET'])
+@cached_response
 def get_product(product_id):
     conn = get_db_connection()
-    product = conn.execute('SELECT * FROM products WHERE id = ?', (product_id,)).fetchone()
+    product = conn.execute('SELECT %s FROM products WHERE id = ?' % ', '.join(PRODUCT_FIELDS), (product_id,)).fetchone()
     conn.close()
     if product:
         return jsonify({"message": "success", "data": dict(product)})
     return jsonify({"error": "Product not found"}), 404
 
-@app.route('/api/products/<int:product_id>', methods=['PUT'])
+@api.route('/api/products/<int:product_id>', methods=['PUT'])
 def update_product(product_id):
     name = request.form['name']
     description = request.form.get('description')
@@ -342,145 +1895,667 @@ def update_product(product_id):
         files = request.files.getlist('images')
         if len(files) > 5:
             return jsonify({"error": "Maximum 5 images allowed"}), 400
-        for file in files:
-            if file.filename != '':
-                filename = str(uuid.uuid4()) + os.path.splitext(file.filename)[1]
-                temp_path = os.path.join(app.config['UPLOAD_FOLDER'], "temp_" + filename)
-                file.save(temp_path)
-                resize_image(temp_path, os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                os.remove(temp_path)
-                image_filenames.append(filename)
+        image_filenames = queue_images(files)
     
     # If new images are uploaded, update the image paths
     if image_filenames:
         image_paths = ', '.join(image_filenames)
         conn = get_db_connection()
-        conn.execute('UPDATE products SET name = ?, description = ?, price = ?, offer_price = ?, image = ?, category = ?, colors = ?, condition = ? WHERE id = ?', (name, description, price, offer_price, image_paths, category, colors, condition, product_id))
+        old = conn.execute('SELECT image FROM products WHERE id = ?', (product_id,)).fetchone()
+        conn.execute('UPDATE products SET name = ?, description = ?, price = ?, offer_price = ?, image = ?, category = ?, category_id = (SELECT id FROM categories WHERE name = ?), colors = ?, condition = ? WHERE id = ?', (name, description, price, offer_price, image_paths, category, category, colors, condition, product_id))
+        unreferenced = []
+        if old:
+            add_upload_refs(conn, image_filenames)
+            unreferenced = release_upload_refs(conn, split_images(old['image']))
         conn.commit()
         conn.close()
+        delete_uploads(unreferenced)
     else:
         # If no new images, update other fields without changing the image path
         conn = get_db_connection()
-        conn.execute('UPDATE products SET name = ?, description = ?, price = ?, offer_price = ?, category = ?, colors = ?, condition = ? WHERE id = ?', (name, description, price, offer_price, category, colors, condition, product_id))
+        conn.execute('UPDATE products SET name = ?, description = ?, price = ?, offer_price = ?, category = ?, category_id = (SELECT id FROM categories WHERE name = ?), colors = ?, condition = ? WHERE id = ?', (name, description, price, offer_price, category, category, colors, condition, product_id))
         conn.commit()
         conn.close()
-    return jsonify({"message": "success", "changes": 1})
+    invalidate_catalog()
+    return jsonify({"message": "success", "changes": 1, "pending_images": image_filenames})
+
+@api.route('/api/products/<int:product_id>', methods=['DELETE'])
+def delete_product(product_id):
+    conn = get_db_connection()
+    product = conn.execute('SELECT image FROM products WHERE id = ?', (product_id,)).fetchone()
+    unreferenced = []
+    if product and product['image']:
+        unreferenced = release_upload_refs(conn, split_images(product['image']))
 
+    conn.execute('DELETE FROM products WHERE id = ?', (product_id,))
+    conn.commit()
+    invalidate_catalog()
     conn.close()
+    delete_uploads(unreferenced)
     return jsonify({"message": "deleted", "changes": 1})
 
-# Dashboard Analytics
-@app.route('/api/dashboard/sales', methods=['GET'])
+# Bulk product import: POST a CSV or JSON file of products plus an optional zip of
+# images. Rows go in with executemany, one transaction per chunk, and the job row
+# checkpoints progress after each chunk; POST again with job_id to resume. Rows whose
+# product_code already exists are skipped, so re-sending a file is safe.
+IMPORT_CHUNK_SIZE = 500
+MAX_IMPORT_ERRORS = 1000
+IMPORT_COLUMNS = ('name', 'description', 'price', 'offer_price', 'category', 'colors', 'condition', 'product_code', 'quantity')
+
+def read_import_rows(file):
+    text = file.read().decode('utf-8-sig')
+    if file.filename.lower().endswith('.json'):
+        data = json.loads(text)
+        rows = data.get('products', []) if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('JSON must be a list of product objects')
+        return rows
+    return list(csv.DictReader(io.StringIO(text)))
+
+def import_text(row, column):
+    # JSON rows can hold any type; numbers pass as text, lists and objects are row errors
+    value = row.get(column)
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError('%s must be text' % column)
+
+def parse_import_row(row, archive_names):
+    # Returns (column values, image names) or raises ValueError with a readable message
+    name = (import_text(row, 'name') or '').strip()
+    if not name:
+        raise ValueError('name is required')
+    try:
+        price = float(row['price'])
+        offer_price = float(row.get('offer_price') or 0.0)
+        quantity = int(row.get('quantity') or 0)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('price, offer_price and quantity must be numbers')
+    images = row.get('images') or []
+    if isinstance(images, str):
+        images = re.split(r'[;,]', images)
+    if not isinstance(images, list) or not all(isinstance(image, str) for image in images):
+        raise ValueError('images must be a list of file names')
+    images = [image.strip() for image in images if image.strip()]
+    if len(images) > 5:
+        raise ValueError('Maximum 5 images allowed')
+    missing = [image for image in images if image not in archive_names]
+    if missing:
+        raise ValueError('images not found in archive: ' + ', '.join(missing))
+    product_code = (import_text(row, 'product_code') or '').strip() or str(uuid.uuid4())
+    values = [name, import_text(row, 'description'), price, offer_price, import_text(row, 'category'),
+              import_text(row, 'colors'), import_text(row, 'condition'), product_code, quantity]
+    return values, images
+
+@api.route('/api/products/import', methods=['POST'])
+def import_products():
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return jsonify({"error": "A CSV or JSON file is required"}), 400
+    try:
+        rows = read_import_rows(request.files['file'])
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": "Could not read import file: %s" % e}), 400
+
+    archive = None
+    if 'images' in request.files and request.files['images'].filename != '':
+        try:
+            archive = zipfile.ZipFile(request.files['images'].stream)
+        except zipfile.BadZipFile:
+            return jsonify({"error": "images must be a zip archive"}), 400
+    try:
+        return run_import(rows, archive)
+    finally:
+        if archive is not None:
+            archive.close()
+
+def run_import(rows, archive):
+    # Rows refer to images by file name, wherever they sit in the archive
+    archive_names = {}
+    if archive is not None:
+        archive_names = {os.path.basename(info.filename): info for info in archive.infolist() if not info.is_dir()}
+    archive_paths = {}
+
+    conn = get_db_connection()
+    job_id = request.form.get('job_id', type=int)
+    if job_id:
+        job = conn.execute('SELECT * FROM import_jobs WHERE id = ?', (job_id,)).fetchone()
+        if job is None:
+            return jsonify({"error": "Import job not found"}), 404
+        if job['total_rows'] != len(rows):
+            return jsonify({"error": "File has %d rows but job %d was started with %d" % (len(rows), job_id, job['total_rows'])}), 409
+        start = job['processed_rows']
+        errors = json.loads(job['errors'])
+        conn.execute("UPDATE import_jobs SET status = 'running', updated_at = CURRENT_TIMESTAMP WHERE id = ?", (job_id,))
+    else:
+        job_id = conn.execute('INSERT INTO import_jobs (total_rows) VALUES (?)', (len(rows),)).lastrowid
+        start = 0
+        errors = []
+    conn.commit()
+
+    try:
+        for chunk_start in range(start, len(rows), IMPORT_CHUNK_SIZE):
+            chunk = rows[chunk_start:chunk_start + IMPORT_CHUNK_SIZE]
+            parsed = []
+            for offset, row in enumerate(chunk):
+                try:
+                    parsed.append(parse_import_row(row, archive_names))
+                except ValueError as e:
+                    if len(errors) < MAX_IMPORT_ERRORS:
+                        # Row numbers are 1-based data rows, not counting a CSV header
+                        errors.append({"row": chunk_start + offset + 1, "error": str(e)})
+            codes = [values[7] for values, _ in parsed]
+            existing = set()
+            if codes:
+                existing = {row['product_code'] for row in conn.execute('SELECT product_code FROM products WHERE product_code IN (%s)' % ', '.join('?' * len(codes)), codes)}
+            new_rows = []
+            staged = []
+            for values, images in parsed:
+                if values[7] in existing:
+                    continue
+                existing.add(values[7])
+                filenames = []
+                for image in images:
+                    path = archive_paths.get(image)
+                    if path is None:
+                        with archive.open(archive_names[image]) as source:
+                            path = archive_paths[image] = content_path(hash_upload(source, RESIZE_RECIPE), image)
+                    staged.append((path, functools.partial(extract_archive_member, archive, archive_names[image])))
+                    filenames.append(path)
+                new_rows.append(values[:4] + [', '.join(filenames)] + values[4:])
+            conn.executemany(PRODUCT_INSERT_SQL, new_rows)
+            add_upload_refs(conn, [path for path, _ in staged])
+            image_jobs = claim_image_jobs(conn, staged)
+            conn.execute('''
+                UPDATE import_jobs SET processed_rows = ?, inserted_rows = inserted_rows + ?, skipped_rows = skipped_rows + ?,
+                    errors = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (chunk_start + len(chunk), len(new_rows), len(parsed) - len(new_rows), json.dumps(errors), job_id))
+            conn.commit()
+            submit_image_jobs(image_jobs)
+    except Exception as e:
+        conn.rollback()
+        conn.execute("UPDATE import_jobs SET status = 'failed', updated_at = CURRENT_TIMESTAMP WHERE id = ?", (job_id,))
+        conn.commit()
+        invalidate_catalog()
+        return jsonify({"error": "Import stopped: %s" % e, "job_id": job_id, "resume": "POST the same file again with job_id=%d" % job_id}), 500
+
+    conn.execute("UPDATE import_jobs SET status = 'completed', updated_at = CURRENT_TIMESTAMP WHERE id = ?", (job_id,))
+    conn.commit()
+    invalidate_catalog()
+    job = conn.execute('SELECT * FROM import_jobs WHERE id = ?', (job_id,)).fetchone()
+    conn.close()
+    return jsonify({"message": "success", "data": import_job_data(job)}), 201
+
+def extract_archive_member(archive, info, temp_path):
+    with archive.open(info) as source, open(temp_path, 'wb') as target:
+        shutil.copyfileobj(source, target)
+
+@api.route('/api/products/import/<int:job_id>', methods=['GET'])
+def get_import_job(job_id):
+    conn = get_db_connection()
+    job = conn.execute('SELECT * FROM import_jobs WHERE id = ?', (job_id,)).fetchone()
+    conn.close()
+    if job:
+        return jsonify({"message": "success", "data": import_job_data(job)})
+    return jsonify({"error": "Import job not found"}), 404
+
+def import_job_data(job):
+    data = dict(job)
+    data['errors'] = json.loads(data['errors'])
+    return data
+
+# Image processing status
+@api.route('/api/images/<path:image_id>', methods=['GET'])
+def get_image_status(image_id):
+    conn = get_db_connection()
+    job = conn.execute('SELECT * FROM image_jobs WHERE id = ?', (image_id,)).fetchone()
+    conn.close()
+    if job:
+        return jsonify({"message": "success", "data": dict(job)})
+    return jsonify({"error": "Image not found"}), 404
+
+@api.route('/api/images', methods=['GET'])
+def get_image_statuses():
+    image_ids = [image_id.strip() for image_id in request.args.get('ids', '').split(',') if image_id.strip()]
+    if not image_ids:
+        return jsonify({"error": "ids is required"}), 400
+    conn = get_db_connection()
+    jobs = conn.execute('SELECT * FROM image_jobs WHERE id IN (%s)' % ', '.join('?' * len(image_ids)), image_ids).fetchall()
+    conn.close()
+    return jsonify({"message": "success", "data": [dict(job) for job in jobs]})
+
+@api.cli.command('resume-image-jobs')
+def resume_image_jobs_command():
+    """Requeue image jobs left pending by a stopped worker."""
+    init_db()
+    conn = db_pool.acquire()
+    jobs = conn.execute("SELECT id FROM image_jobs WHERE status = 'pending'").fetchall()
+    conn.close()
+    futures = []
+    for job in jobs:
+        temp_path = temp_upload_path(job['id'])
+        output_path = upload_file_path(job['id'])
+        if os.path.exists(temp_path):
+            future = get_image_executor().submit(resize_image, temp_path, output_path)
+        else:
+            future = Future()
+            future.set_exception(FileNotFoundError('upload was lost before processing'))
+        futures.append((job['id'], temp_path, future))
+    for image_id, temp_path, future in futures:
+        finish_image_job(image_id, temp_path, future)
+    print('Processed %d pending image jobs.' % len(futures))
+
+@api.cli.command('migrate-uploads')
+def migrate_uploads_command():
+    """Move flat uploads into the content-addressed tree and rewrite image references."""
+    init_db()
+    conn = db_pool.acquire()
+    conn.execute('BEGIN IMMEDIATE')
+    # Old uploads have no directory in their name; files that are gone keep their name
+    renamed = {}
+    rows = 0
+    for table in ('products', 'categories', 'banners'):
+        for row in conn.execute('SELECT id, image FROM %s' % table).fetchall():
+            images = split_images(row['image'])
+            if all('/' in name for name in images):
+                continue
+            for name in images:
+                filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], name)
+                if '/' in name or name in renamed or not os.path.exists(filepath):
+                    continue
+                with open(filepath, 'rb') as f:
+                    renamed[name] = content_path(hash_upload(f), name)
+                # Link the new path in before the references change; the old name goes after commit
+                target = upload_file_path(renamed[name])
+                if not os.path.exists(target):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    try:
+                        os.link(filepath, target)
+                    except OSError:
+                        shutil.copy2(filepath, target)
+            conn.execute('UPDATE %s SET image = ? WHERE id = ?' % table, (', '.join(renamed.get(name, name) for name in images), row['id']))
+            rows += 1
+    rebuild_upload_refs(conn)
+    conn.commit()
+    conn.close()
+    for name in renamed:
+        os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], name))
+    print('Moved %d files into %d content paths and rewrote %d rows.' % (len(renamed), len(set(renamed.values())), rows))
+
+# Upload garbage collection: marks every path referenced by products, categories and
+# banners (plus images still being processed) and sweeps the rest of the uploads
+# folder. Files younger than the grace period are left alone so uploads that are not
+# yet attached to a row survive. Temp files of pending jobs are kept for
+# resume-image-jobs. Run it with `flask --app app gc-uploads`, or set
+# UPLOAD_GC_INTERVAL to run it in a background thread of each worker.
+UPLOAD_GC_GRACE = 3600
+UPLOAD_GC_INTERVAL = int(os.environ.get('UPLOAD_GC_INTERVAL', 0))
+
+def collect_upload_garbage(upload_folder, grace=UPLOAD_GC_GRACE, dry_run=False):
+    conn = db_pool.acquire()
+    try:
+        referenced = set()
+        for row in conn.execute('SELECT image FROM products UNION ALL SELECT image FROM categories UNION ALL SELECT image FROM banners'):
+            referenced.update(split_images(row['image']))
+        pending = {row['id'] for row in conn.execute("SELECT id FROM image_jobs WHERE status = 'pending'")}
+    finally:
+        conn.close()
+    referenced |= pending
+    pending_temps = {"temp_" + os.path.basename(path) for path in pending}
+
+    cutoff = time.time() - grace
+    swept = []
+    reclaimed = 0
+    for root, dirs, files in os.walk(upload_folder):
+        for name in files:
+            filepath = os.path.join(root, name)
+            path = os.path.relpath(filepath, upload_folder).replace(os.sep, '/')
+            if name.startswith('temp_'):
+                if name in pending_temps:
+                    continue
+            elif path in referenced:
+                continue
+            try:
+                stat = os.stat(filepath)
+                if stat.st_mtime > cutoff:
+                    continue
+                if not dry_run:
+                    os.remove(filepath)
+            except FileNotFoundError:
+                continue
+            swept.append(path)
+            reclaimed += stat.st_size
+
+    if not dry_run:
+        # Drop refcount rows for swept files and prune emptied shard directories. Uploads
+        # create their directory before writing into it, so a directory gets the same
+        # grace period as a file; emptied ones go on a later pass.
+        conn = db_pool.acquire()
+        conn.executemany('DELETE FROM upload_refs WHERE path = ?', [(path,) for path in swept])
+        conn.commit()
+        conn.close()
+        for root, dirs, files in os.walk(upload_folder, topdown=False):
+            try:
+                if root != upload_folder and not os.listdir(root) and os.stat(root).st_mtime <= cutoff:
+                    os.rmdir(root)
+            except OSError:
+                pass # refilled, or removed by another worker's pass
+    return {"files": len(swept), "temp_files": sum(1 for path in swept if os.path.basename(path).startswith('temp_')),
+            "reclaimed_bytes": reclaimed, "dry_run": dry_run, "swept": swept}
+
+def run_upload_gc(upload_folder, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            report = collect_upload_garbage(upload_folder)
+            if report['files']:
+                logger.info('Upload GC reclaimed %d bytes from %d files.', report['reclaimed_bytes'], report['files'])
+        except Exception:
+            logger.exception('Upload GC failed')
+
+@api.cli.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Report what would be deleted without deleting it.')
+@click.option('--grace', default=UPLOAD_GC_GRACE, show_default=True, help='Only sweep files older than this many seconds.')
+def gc_uploads_command(dry_run, grace):
+    """Delete upload files no product, category or banner refers to."""
+    init_db()
+    report = collect_upload_garbage(current_app.config['UPLOAD_FOLDER'], grace, dry_run)
+    for path in report['swept']:
+        print(('would delete ' if dry_run else 'deleted ') + path)
+    print('%s %d bytes from %d files (%d stale temp files).' % ('Would reclaim' if dry_run else 'Reclaimed', report['reclaimed_bytes'], report['files'], report['temp_files']))
+
+@api.route('/api/images/variants', methods=['POST'])
+def pregenerate_image_variants():
+    # Queue the standard sizes for the given images, or for every image in the catalog
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    for key in ('sizes', 'formats', 'images'):
+        value = data.get(key)
+        if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+            return jsonify({"error": "%s must be a list of strings" % key}), 400
+    size_names = data.get('sizes') or list(STANDARD_IMAGE_SIZES)
+    unknown = [name for name in size_names if name not in STANDARD_IMAGE_SIZES]
+    if unknown:
+        return jsonify({"error": "Unknown sizes: " + ', '.join(unknown)}), 400
+    formats = data.get('formats') or list(VARIANT_FORMATS)
+    if any(fmt not in VARIANT_FORMATS for fmt in formats):
+        return jsonify({"error": "formats must be webp or jpeg"}), 400
+
+    images = data.get('images')
+    if not images:
+        conn = get_db_connection()
+        images = set()
+        for row in conn.execute('SELECT image FROM products UNION ALL SELECT image FROM categories UNION ALL SELECT image FROM banners'):
+            images.update(split_images(row['image']))
+        conn.close()
+    images = [name for name in images if safe_join(current_app.config['UPLOAD_FOLDER'], name) and os.path.exists(safe_join(current_app.config['UPLOAD_FOLDER'], name))]
+
+    # Finished variants count toward VARIANT_CACHE_BYTES like ones made on request
+    executor = get_variant_executor()
+    variant_folder = current_app.config['VARIANT_FOLDER']
+    on_done = functools.partial(finish_variant, variant_folder)
+    queued = 0
+    for name in images:
+        for size_name in size_names:
+            width, height = STANDARD_IMAGE_SIZES[size_name]
+            for fmt in formats:
+                if os.path.exists(os.path.join(variant_folder, variant_name_for(name, width, height, fmt))):
+                    continue
+                future = executor.submit(generate_variant, current_app.config['UPLOAD_FOLDER'], variant_folder, name, width, height, fmt)
+                future.add_done_callback(on_done)
+                queued += 1
+    return jsonify({"message": "queued", "images": len(images), "variants": queued}), 202
+
+# Dashboard Analytics (served from the rollup tables)
+def dashboard_total_sales(conn):
+    return conn.execute("SELECT SUM(total_amount) FROM order_stats_monthly WHERE status = 'Delivered'").fetchone()[0] or 0
+
+def dashboard_preview_count(conn):
+    return conn.execute('SELECT SUM(preview_count) FROM preview_stats_monthly').fetchone()[0] or 0
+
+def dashboard_monthly_sales(conn):
+    # Delivered sales per month
+    rows = conn.execute("SELECT period as month, total_amount FROM order_stats_monthly WHERE status = 'Delivered' AND order_count > 0 ORDER BY period").fetchall()
+    return [dict(row) for row in rows]
+
+def dashboard_monthly_previews(conn):
+    # Previews per month, across all statuses
+    rows = conn.execute("SELECT period as month, SUM(preview_count) as total_previews FROM preview_stats_monthly GROUP BY period HAVING total_previews > 0 ORDER BY period").fetchall()
+    return [dict(row) for row in rows]
+
+@api.route('/api/dashboard/summary', methods=['GET'])
+def get_dashboard_summary():
+    # Everything the admin dashboard shows, from count-only queries on one connection
+    conn = get_db_connection()
+    summary = {
+        "total_products": conn.execute('SELECT COUNT(*) FROM products').fetchone()[0],
+        "total_orders": conn.execute('SELECT SUM(order_count) FROM order_stats_monthly').fetchone()[0] or 0,
+        "total_customers": conn.execute('SELECT COUNT(*) FROM users').fetchone()[0],
+        "preview_count": dashboard_preview_count(conn),
+        "total_sales": dashboard_total_sales(conn),
+        "monthly_sales": dashboard_monthly_sales(conn),
+        "monthly_previews": dashboard_monthly_previews(conn),
+    }
+    conn.close()
+    return jsonify({"message": "success", "data": summary})
+
+@api.route('/api/dashboard/sales', methods=['GET'])
 def get_total_sales():
     conn = get_db_connection()
-    total_sales = conn.execute("SELECT SUM(total) FROM new_orders WHERE status = 'Delivered'").fetchone()[0]
+    total_sales = dashboard_total_sales(conn)
     conn.close()
-    return jsonify({"total_sales": total_sales or 0})
+    return jsonify({"total_sales": total_sales})
 
-@app.route('/api/dashboard/previews/count', methods=['GET'])
+@api.route('/api/dashboard/previews/count', methods=['GET'])
 def get_preview_count():
     conn = get_db_connection()
-    preview_count = conn.execute('SELECT COUNT(*) FROM previews').fetchone()[0]
+    preview_count = dashboard_preview_count(conn)
     conn.close()
-    return jsonify({"preview_count": preview_count or 0})
+    return jsonify({"preview_count": preview_count})
 
-@app.route('/api/dashboard/monthly_sales', methods=['GET'])
+@api.route('/api/dashboard/monthly_sales', methods=['GET'])
 def get_monthly_sales():
     conn = get_db_connection()
-    # This query groups sales by month and year for delivered orders
-    monthly_sales = conn.execute("SELECT STRFTIME('%Y-%m', created_at) as month, SUM(total) as total_amount FROM new_orders WHERE status = 'Delivered' GROUP BY month ORDER BY month").fetchall()
+    monthly_sales = dashboard_monthly_sales(conn)
     conn.close()
-    return jsonify({"data": [dict(row) for row in monthly_sales]})
+    return jsonify({"data": monthly_sales})
 
-@app.route('/api/dashboard/monthly_previews', methods=['GET'])
+@api.route('/api/dashboard/monthly_previews', methods=['GET'])
 def get_monthly_previews():
     conn = get_db_connection()
-    # This query groups previews by month and year
-    monthly_previews = conn.execute("SELECT STRFTIME('%Y-%m', created_at) as month, COUNT(*) as total_previews FROM previews GROUP BY month ORDER BY month").fetchall()
+    monthly_previews = dashboard_monthly_previews(conn)
     conn.close()
-    return jsonify({"data": [dict(row) for row in monthly_previews]})
+    return jsonify({"data": monthly_previews})
+
+@api.route('/api/dashboard/daily', methods=['GET'])
+def get_daily_stats():
+    # Per-day sales and previews for any range: ?from=YYYY-MM-DD&to=YYYY-MM-DD[&status=Delivered]
+    date_from = request.args.get('from', '0000-00-00')
+    date_to = request.args.get('to', '9999-12-31')
+    status = request.args.get('status', 'Delivered')
+    conn = get_db_connection()
+    sales = conn.execute('SELECT period as day, order_count, total_amount FROM order_stats_daily WHERE status = ? AND period BETWEEN ? AND ? AND order_count > 0 ORDER BY period', (status, date_from, date_to)).fetchall()
+    previews = conn.execute('SELECT period as day, SUM(preview_count) as total_previews FROM preview_stats_daily WHERE period BETWEEN ? AND ? GROUP BY period HAVING total_previews > 0 ORDER BY period', (date_from, date_to)).fetchall()
+    conn.close()
+    return jsonify({
+        "message": "success",
+        "sales": [dict(row) for row in sales],
+        "previews": [dict(row) for row in previews],
+        "total_sales": sum(row['total_amount'] for row in sales),
+        "total_orders": sum(row['order_count'] for row in sales),
+        "total_previews": sum(row['total_previews'] for row in previews),
+    })
 
 # Categories
-@app.route('/api/categories', methods=['GET'])
+@api.route('/api/categories', methods=['GET'])
+@cached_response
 def get_categories():
     conn = get_db_connection()
     categories = conn.execute('SELECT * FROM categories').fetchall()
     conn.close()
     return jsonify({"message": "success", "data": [dict(row) for row in categories]})
 
-@app.route('/api/categories', methods=['POST'])
+def link_category_products(conn, category_id, name):
+    # Products follow a renamed category, and ones left without a category by a
+    # deleted one join a new category with their old name
+    conn.execute('''
+        UPDATE products SET category = ?1, category_id = ?2
+        WHERE (category_id = ?2 AND category IS NOT ?1) OR (category_id IS NULL AND category = ?1)
+    ''', (name, category_id))
+
+@api.route('/api/categories', methods=['POST'])
 def add_category():
     name = request.form['name']
     image_filename = None
+    pending_images = []
     if 'image' in request.files:
-        file = request.files['image']
-        if file.filename != '':
-            image_filename = str(uuid.uuid4()) + os.path.splitext(file.filename)[1]
-            temp_path = os.path.join(app.config['UPLOAD_FOLDER'], "temp_" + image_filename)
-            file.save(temp_path)
-            resize_image(temp_path, os.path.join(app.config['UPLOAD_FOLDER'], image_filename))
-            os.remove(temp_path)
+        pending_images = queue_images([request.files['image']])
+        if pending_images:
+            image_filename = pending_images[0]
 
     conn = get_db_connection()
     cursor = conn.execute('INSERT INTO categories (name, image) VALUES (?, ?)', (name, image_filename))
+    link_category_products(conn, cursor.lastrowid, name)
+    add_upload_refs(conn, pending_images)
     conn.commit()
+    invalidate_catalog()
     category_id = cursor.lastrowid
     conn.close()
-    return jsonify({"message": "success", "data": {'id': category_id, 'name': name, 'image': image_filename}}), 201
+    return jsonify({"message": "success", "data": {'id': category_id, 'name': name, 'image': image_filename}, "pending_images": pending_images}), 201
 
-@app.route('/api/categories/<int:category_id>', methods=['PUT'])
+@api.route('/api/categories/<int:category_id>', methods=['PUT'])
 def update_category(category_id):
     name = request.form['name']
     image_filename = None
 
+    pending_images = []
     if 'image' in request.files:
-        file = request.files['image']
-        if file.filename != '':
-            image_filename = str(uuid.uuid4()) + os.path.splitext(file.filename)[1]
-            temp_path = os.path.join(app.config['UPLOAD_FOLDER'], "temp_" + image_filename)
-            file.save(temp_path)
-            resize_image(temp_path, os.path.join(app.config['UPLOAD_FOLDER'], image_filename))
-            os.remove(temp_path)
+        pending_images = queue_images([request.files['image']])
+        if pending_images:
+            image_filename = pending_images[0]
 
     conn = get_db_connection()
+    unreferenced = []
     if image_filename:
+        old = conn.execute('SELECT image FROM categories WHERE id = ?', (category_id,)).fetchone()
         conn.execute('UPDATE categories SET name = ?, image = ? WHERE id = ?', (name, image_filename, category_id))
+        if old:
+            add_upload_refs(conn, pending_images)
+            unreferenced = release_upload_refs(conn, split_images(old['image']))
     else:
         conn.execute('UPDATE categories SET name = ? WHERE id = ?', (name, category_id))
+    link_category_products(conn, category_id, name)
     conn.commit()
+    invalidate_catalog()
     conn.close()
-    return jsonify({"message": "success", "changes": 1})
+    delete_uploads(unreferenced)
+    return jsonify({"message": "success", "changes": 1, "pending_images": pending_images})
 
-@app.route('/api/categories/<int:category_id>', methods=['DELETE'])
+@api.route('/api/categories/<int:category_id>', methods=['DELETE'])
 def delete_category(category_id):
     conn = get_db_connection()
     category = conn.execute('SELECT image FROM categories WHERE id = ?', (category_id,)).fetchone()
+    unreferenced = []
     if category and category['image']:
-        image_filename = category['image']
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], image_filename)
-        if os.path.exists(filepath):
-            try:
-                os.remove(filepath)
-            except OSError as e:
-                print(f"Error deleting category image {filepath}: {e}")
+        unreferenced = release_upload_refs(conn, split_images(category['image']))
 
     conn.execute('DELETE FROM categories WHERE id = ?', (category_id,))
+    conn.execute('UPDATE products SET category_id = NULL WHERE category_id = ?', (category_id,))
     conn.commit()
+    invalidate_catalog()
     conn.close()
+    delete_uploads(unreferenced)
     return jsonify({"message": "deleted", "changes": 1})
 
-@app.route('/api/orders', methods=['GET'])
+ORDERS_PER_PAGE = 50
+MAX_ORDERS_PER_PAGE = 200
+# An order as /api/orders lists it. The products summary is a correlated subquery,
+# so it only runs for the rows returned.
+ORDER_ROW_SQL = '''
+    SELECT o.*, COALESCE((
+        SELECT GROUP_CONCAT(p.name || ' (x' || i.quantity || ')', '; ')
+        FROM order_items i JOIN products p ON i.product_id = p.id
+        WHERE i.order_id = o.id
+    ), '') as products
+    FROM new_orders o
+'''
+
+@api.route('/api/orders', methods=['GET'])
 def get_orders():
-    user_phone = request.args.get('user_phone')
+    # Newest first, paged on id: ?cursor=&per_page=&status=&phone=&from=YYYY-MM-DD&to=YYYY-MM-DD&include=items.
+    # With a date range, pages follow (created_at, id) instead, so the created_at and
+    # status/created_at indexes (which end in id) serve the range without a sort.
+    phone = request.args.get('phone') or request.args.get('user_phone')
+    status = request.args.get('status')
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    per_page = min(max(request.args.get('per_page', ORDERS_PER_PAGE, type=int), 1), MAX_ORDERS_PER_PAGE)
+    include = set(request.args.get('include', '').split(','))
+
+    where_clauses = []
+    params = []
+    if phone:
+        where_clauses.append('o.customer_phone = ?')
+        params.append(phone)
+    if status:
+        where_clauses.append('o.status = ?')
+        params.append(status)
+    if date_from:
+        where_clauses.append('o.created_at >= ?')
+        params.append(date_from)
+    if date_to:
+        where_clauses.append("o.created_at < DATE(?, '+1 day')")
+        params.append(date_to)
+    by_date = bool(date_from or date_to)
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor_values = decode_cursor(cursor)
+        if by_date:
+            valid = cursor_values is not None and len(cursor_values) == 2 and isinstance(cursor_values[0], str) and type(cursor_values[1]) is int
+        else:
+            valid = cursor_values is not None and len(cursor_values) == 1 and type(cursor_values[0]) is int
+        if not valid:
+            return jsonify({"error": "Invalid cursor"}), 400
+        if by_date:
+            where_clauses.append('(o.created_at, o.id) < (?, ?)')
+            params.extend(cursor_values)
+        else:
+            where_clauses.append('o.id < ?')
+            params.append(cursor_values[0])
+
+    query = ORDER_ROW_SQL
+    if where_clauses:
+        query += ' WHERE ' + ' AND '.join(where_clauses)
+    query += ' ORDER BY o.created_at DESC, o.id DESC LIMIT ?' if by_date else ' ORDER BY o.id DESC LIMIT ?'
+    params.append(per_page + 1)
+
     conn = get_db_connection()
-    if user_phone:
-        orders = conn.execute('SELECT o.*, GROUP_CONCAT(p.name || " (x" || i.quantity || ")", "; ") as products FROM new_orders o JOIN order_items i ON o.id = i.order_id JOIN products p ON i.product_id = p.id WHERE o.customer_phone = ? GROUP BY o.id', (user_phone,)).fetchall()
-    else:
-        orders = conn.execute('SELECT o.*, GROUP_CONCAT(p.name || " (x" || i.quantity || ")", "; ") as products FROM new_orders o JOIN order_items i ON o.id = i.order_id JOIN products p ON i.product_id = p.id GROUP BY o.id').fetchall()
+    rows = conn.execute(query, params).fetchall()
+    orders = [dict(row) for row in rows[:per_page]]
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_cursor([orders[-1]['created_at'], orders[-1]['id']] if by_date else [orders[-1]['id']])
+
+    if 'items' in include and orders:
+        order_ids = [order['id'] for order in orders]
+        items = conn.execute('''
+            SELECT i.order_id, i.product_id, p.name, p.image, i.quantity, i.price
+            FROM order_items i
+            LEFT JOIN products p ON i.product_id = p.id
+            WHERE i.order_id IN (%s)
+            ORDER BY i.id
+        ''' % ', '.join('?' * len(order_ids)), order_ids).fetchall()
+        items_by_order = {order_id: [] for order_id in order_ids}
+        for item in items:
+            items_by_order[item['order_id']].append(dict(item))
+        for order in orders:
+            order['items'] = items_by_order[order['id']]
     conn.close()
-    return jsonify({"message": "success", "data": [dict(row) for row in orders]})
+    return jsonify({"message": "success", "data": orders, "next_cursor": next_cursor})
 
-@app.route('/api/orders', methods=['POST'])
+@api.route('/api/orders', methods=['POST'])
 def add_order():
     new_order = request.json
     product_id = new_order['product_id']
@@ -495,7 +2570,7 @@ def add_order():
     conn.close()
     return jsonify({"message": "success", "data": {'id': order_id, 'product_id': product_id, 'quantity': quantity, 'customer_name': customer_name, 'customer_phone': customer_phone}}), 201
 
-@app.route('/api/orders/<int:order_id>', methods=['GET'])
+@api.route('/api/orders/<int:order_id>', methods=['GET'])
 def get_order(order_id):
     conn = get_db_connection()
     order = conn.execute('SELECT * FROM new_orders WHERE id = ?', (order_id,)).fetchone()
@@ -517,18 +2592,20 @@ def get_order(order_id):
     
     return jsonify(order_data)
 
-@app.route('/api/orders/<int:order_id>', methods=['PUT'])
+@api.route('/api/orders/<int:order_id>', methods=['PUT'])
 def update_order_status(order_id):
     updated_order = request.json
     status = updated_order['status']
 
     conn = get_db_connection()
+    apply_order_stats(conn, order_id, -1)
     conn.execute('UPDATE new_orders SET status = ? WHERE id = ?', (status, order_id))
+    apply_order_stats(conn, order_id, 1)
     conn.commit()
     conn.close()
     return jsonify({"message": "success", "changes": 1})
 
-@app.route('/api/admin/login', methods=['POST'])
+@api.route('/api/admin/login', methods=['POST'])
 def admin_login():
     data = request.json
     email = data.get('email')
@@ -540,7 +2617,7 @@ def admin_login():
     else:
         return jsonify({"error": "Invalid credentials"}), 401
 
-@app.route('/api/user/register', methods=['POST'])
+@api.route('/api/user/register', methods=['POST'])
 def user_register():
     data = request.json
     name = data.get('name')
@@ -562,7 +2639,7 @@ def user_register():
         conn.close()
         return jsonify({"error": "Phone or email already registered"}), 409
 
-@app.route('/api/user/login', methods=['POST'])
+@api.route('/api/user/login', methods=['POST'])
 def user_login():
     data = request.json
     identifier = data.get('identifier') # Can be phone or email
@@ -581,14 +2658,15 @@ def user_login():
         return jsonify({"error": "Invalid credentials"}), 401
 
 # Banners
-@app.route('/api/banners', methods=['GET'])
+@api.route('/api/banners', methods=['GET'])
+@cached_response
 def get_banners():
     conn = get_db_connection()
     banners = conn.execute('SELECT * FROM banners').fetchall()
     conn.close()
     return jsonify({"message": "success", "data": [dict(row) for row in banners]})
 
-@app.route('/api/banners', methods=['POST'])
+@api.route('/api/banners', methods=['POST'])
 def add_banner():
     if 'image' not in request.files:
         return jsonify({"error": "No image file provided"}), 400
@@ -604,36 +2682,184 @@ def add_banner():
         return jsonify({"error": "Maximum 5 banners allowed"}), 400
 
     if file:
-        filename = str(uuid.uuid4()) + os.path.splitext(file.filename)[1]
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        # Banners are stored as uploaded, so their path is the hash of the file itself
+        filename = content_path(hash_upload(file.stream), file.filename)
+        filepath = upload_file_path(filename)
+        if not os.path.exists(filepath):
+            file.stream.seek(0)
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            temp_path = temp_upload_path(filename) + '.' + uuid.uuid4().hex
+            file.save(temp_path)
+            os.replace(temp_path, filepath)
 
         cursor = conn.execute('INSERT INTO banners (image) VALUES (?)', (filename,))
+        add_upload_refs(conn, [filename])
         conn.commit()
+        invalidate_catalog()
         banner_id = cursor.lastrowid
         conn.close()
         return jsonify({"message": "success", "data": {'id': banner_id, 'image': filename}}), 201
     return jsonify({"error": "Failed to upload banner"}), 500
 
-@app.route('/api/banners/<int:banner_id>', methods=['DELETE'])
+@api.route('/api/banners/<int:banner_id>', methods=['DELETE'])
 def delete_banner(banner_id):
     conn = get_db_connection()
     banner = conn.execute('SELECT image FROM banners WHERE id = ?', (banner_id,)).fetchone()
+    unreferenced = []
     if banner and banner['image']:
-        image_filename = banner['image']
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], image_filename)
-        if os.path.exists(filepath):
-            try:
-                os.remove(filepath)
-            except OSError as e:
-                print(f"Error deleting banner image {filepath}: {e}")
+        unreferenced = release_upload_refs(conn, split_images(banner['image']))
 
     conn.execute('DELETE FROM banners WHERE id = ?', (banner_id,))
     conn.commit()
+    invalidate_catalog()
     conn.close()
+    delete_uploads(unreferenced)
     return jsonify({"message": "deleted", "changes": 1})
 
-@app.route('/create-order', methods=['POST'])
+# Checkouts are written by one writer thread per process. Request threads queue
+# their order and wait; the writer takes everything queued (up to ORDER_BATCH_SIZE)
+# and writes it in one transaction, so a burst of checkouts shares one commit instead
+# of queueing for SQLite's write lock one by one. Orders that arrive during a commit
+# make up the next batch. ORDER_BATCH_DELAY (seconds) makes the writer wait for more
+# after the first order of a batch: bigger batches, but every checkout waits that long.
+# If any order in a batch fails, its orders are retried one transaction each so only
+# the bad one gets the error.
+ORDER_BATCH_DELAY = float(os.environ.get('ORDER_BATCH_DELAY', 0))
+ORDER_BATCH_SIZE = 200
+ORDER_WRITE_TIMEOUT = 30
+ORDER_INSERT_SQL = '''
+    INSERT INTO new_orders (customer_name, customer_phone, delivery_address, delivery_location, payment_method, bkash_trx_id, subtotal, delivery_charge, total)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+ORDER_ITEM_INSERT_SQL = 'INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)'
+
+class PendingOrder:
+    def __init__(self, order, items):
+        self.order = order
+        self.items = items
+        self.order_id = None
+        self.error = None
+        self.done = threading.Event()
+        # Set under OrderWriter.lock: claimed once the writer takes it, abandoned if
+        # the caller gave up first, so an order is never written after a timeout
+        self.claimed = False
+        self.abandoned = False
+
+class OrderQueueTimeout(Exception):
+    pass
+
+class OrderWriter:
+    def __init__(self, delay=ORDER_BATCH_DELAY):
+        self.delay = delay
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.batches = 0
+        self.orders = 0
+
+    def submit(self, order, items):
+        # Blocks until the order is committed; returns its id or raises its error
+        self.start()
+        pending = PendingOrder(order, items)
+        self.queue.put(pending)
+        if not pending.done.wait(ORDER_WRITE_TIMEOUT):
+            with self.lock:
+                pending.abandoned = not pending.claimed
+            if pending.abandoned:
+                raise OrderQueueTimeout('Timed out waiting for the order writer')
+            # Already in a transaction: its outcome is only a moment away
+            pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.order_id
+
+    def start(self):
+        # Started on first use, so each forked worker gets its own thread
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='order-writer', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.delay
+            while len(batch) < ORDER_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            with self.lock:
+                batch = [pending for pending in batch if not pending.abandoned]
+                for pending in batch:
+                    pending.claimed = True
+            if not batch:
+                continue
+            try:
+                self.write(batch)
+            except sqlite3.IntegrityError as e:
+                # A bad order (e.g. an unknown product), not a fault in the writer
+                logger.warning('Order rejected: %s', e)
+                for pending in batch:
+                    pending.error = e
+            except Exception as e:
+                logger.exception('Order batch failed')
+                for pending in batch:
+                    if pending.order_id is None and pending.error is None:
+                        pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+    def write(self, batch):
+        conn = db_pool.acquire()
+        try:
+            try:
+                self.insert(conn, batch)
+                conn.commit()
+                self.count(1, len(batch))
+            except sqlite3.Error:
+                conn.rollback()
+                for pending in batch:
+                    pending.order_id = None
+                if len(batch) == 1:
+                    raise
+                for pending in batch:
+                    try:
+                        self.insert(conn, [pending])
+                        conn.commit()
+                        self.count(1, 1)
+                    except sqlite3.IntegrityError as e:
+                        conn.rollback()
+                        logger.warning('Order rejected: %s', e)
+                        pending.order_id = None
+                        pending.error = e
+                    except sqlite3.Error as e:
+                        conn.rollback()
+                        logger.exception('Order write failed')
+                        pending.order_id = None
+                        pending.error = e
+        finally:
+            conn.close()
+
+    def count(self, batches, orders):
+        # Only committed transactions and the orders in them
+        with self.lock:
+            self.batches += batches
+            self.orders += orders
+
+    def insert(self, conn, batch):
+        # Orders go in one at a time for their ids; the items of the whole batch in one executemany
+        conn.execute('BEGIN IMMEDIATE')
+        for pending in batch:
+            pending.order_id = conn.execute(ORDER_INSERT_SQL, pending.order).lastrowid
+        conn.executemany(ORDER_ITEM_INSERT_SQL, [(pending.order_id,) + item for pending in batch for item in pending.items])
+        for pending in batch:
+            apply_order_stats(conn, pending.order_id, 1)
+
+order_writer = OrderWriter()
+
+@api.route('/create-order', methods=['POST'])
 def create_order():
     data = request.get_json()
 
@@ -652,42 +2878,76 @@ def create_order():
     if not all([customer_name, customer_phone, delivery_address, delivery_location, payment_method, items]):
         return jsonify({'message': 'Missing required fields'}), 400
 
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-
-        # Insert into new_orders table
-        cursor.execute('''
-            INSERT INTO new_orders (customer_name, customer_phone, delivery_address, delivery_location, payment_method, bkash_trx_id, subtotal, delivery_charge, total)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (customer_name, customer_phone, delivery_address, delivery_location, payment_method, bkash_trx_id, subtotal, delivery_charge, total))
-        
-        order_id = cursor.lastrowid
-
-        # Insert into order_items table
-        for item in items:
-            cursor.execute('''
-                INSERT INTO order_items (order_id, product_id, quantity, price)
-                VALUES (?, ?, ?, ?)
-            ''', (order_id, item['id'], item['quantity'], item['price']))
-
-        conn.commit()
+        order_id = order_writer.submit(
+            (customer_name, customer_phone, delivery_address, delivery_location, payment_method, bkash_trx_id, subtotal, delivery_charge, total),
+            [(item['id'], item['quantity'], item['price']) for item in items])
         return jsonify({'message': 'Order created successfully', 'order_id': order_id}), 201
+    except OrderQueueTimeout as e:
+        # The order was dropped from the queue unwritten, so retrying is safe
+        return jsonify({'message': 'Too many orders right now, please retry', 'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        conn.rollback()
         return jsonify({'message': 'Failed to create order', 'error': str(e)}), 500
-    finally:
-        conn.close()
 
 # User Management
-@app.route('/api/users', methods=['GET'])
+USER_SORT_COLUMNS = {
+    'id': 'u.id',
+    'order_count': 's.order_count',
+    'lifetime_value': 's.lifetime_value',
+    'last_order_at': 's.last_order_at',
+}
+USERS_PER_PAGE = 50
+MAX_USERS_PER_PAGE = 200
+# A customer as /api/users lists it
+USER_ROW_SQL = '''
+    SELECT u.id, u.name, u.phone, u.is_active,
+           COALESCE(s.order_count, 0) as order_count,
+           COALESCE(s.lifetime_value, 0) as lifetime_value,
+           s.last_order_at
+    FROM users u LEFT JOIN customer_stats s ON s.phone = u.phone
+'''
+# Metric sorts walk the idx_customer_stats_* indexes (which end in phone, the key), so a
+# page reads only its own rows; users without stats are listed apart, ordered by id
+USER_STATS_ROW_SQL = '''
+    SELECT u.id, u.name, u.phone, u.is_active, s.order_count, s.lifetime_value, s.last_order_at
+    FROM customer_stats s JOIN users u ON u.phone = s.phone
+'''
+USER_NO_STATS_ROW_SQL = '''
+    SELECT u.id, u.name, u.phone, u.is_active, 0 as order_count, 0 as lifetime_value, NULL as last_order_at
+    FROM users u WHERE NOT EXISTS (SELECT 1 FROM customer_stats s WHERE s.phone = u.phone)
+'''
+
+@api.route('/api/users', methods=['GET'])
 def get_users():
+    # ?page=&per_page=&sort=id|order_count|lifetime_value|last_order_at&order=asc|desc
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', USERS_PER_PAGE, type=int), 1), MAX_USERS_PER_PAGE)
+    sort_column = USER_SORT_COLUMNS.get(request.args.get('sort', 'id'))
+    if sort_column is None:
+        return jsonify({"error": "sort must be one of: " + ', '.join(USER_SORT_COLUMNS)}), 400
+    direction = 'DESC' if request.args.get('order', 'asc').lower() == 'desc' else 'ASC'
+
     conn = get_db_connection()
-    users = conn.execute('SELECT u.id, u.name, u.phone, u.is_active, COUNT(o.id) as order_count FROM users u LEFT JOIN new_orders o ON u.phone = o.customer_phone GROUP BY u.id').fetchall()
+    total_users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    offset = (page - 1) * per_page
+    if sort_column == 'u.id':
+        users = conn.execute(USER_ROW_SQL + ' ORDER BY u.id %s LIMIT ? OFFSET ?' % direction, (per_page, offset)).fetchall()
+    else:
+        # Users without stats count as zero: first when ascending, last when descending
+        with_stats = conn.execute('SELECT COUNT(*) FROM customer_stats s JOIN users u ON u.phone = s.phone').fetchone()[0]
+        parts = [(USER_STATS_ROW_SQL + ' ORDER BY %s %s, s.phone %s' % (sort_column, direction, direction), with_stats),
+                 (USER_NO_STATS_ROW_SQL + ' ORDER BY u.id %s' % direction, total_users - with_stats)]
+        if direction == 'ASC':
+            parts.reverse()
+        users = []
+        for query, count in parts:
+            if offset < count and len(users) < per_page:
+                users += conn.execute(query + ' LIMIT ? OFFSET ?', (per_page - len(users), offset)).fetchall()
+            offset = max(offset - count, 0)
     conn.close()
-    return jsonify({"message": "success", "data": [dict(row) for row in users]})
+    return jsonify({"message": "success", "data": [dict(row) for row in users], "total_users": total_users, "total_pages": (total_users + per_page - 1) // per_page, "current_page": page})
 
-@app.route('/api/users/<int:user_id>/status', methods=['PUT'])
+@api.route('/api/users/<int:user_id>/status', methods=['PUT'])
 def update_user_status(user_id):
     data = request.json
     is_active = data.get('is_active')
@@ -698,7 +2958,7 @@ def update_user_status(user_id):
     conn.close()
     return jsonify({"message": "success", "changes": 1})
 
-@app.route('/api/users/<int:user_id>', methods=['DELETE'])
+@api.route('/api/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     conn = get_db_connection()
     conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
@@ -707,14 +2967,14 @@ def delete_user(user_id):
     return jsonify({"message": "deleted", "changes": 1})
 
 # Previews
-@app.route('/api/previews', methods=['GET'])
+@api.route('/api/previews', methods=['GET'])
 def get_previews():
     conn = get_db_connection()
     previews = conn.execute('SELECT * FROM previews').fetchall()
     conn.close()
     return jsonify({"message": "success", "data": [dict(row) for row in previews]})
 
-@app.route('/api/previews', methods=['POST'])
+@api.route('/api/previews', methods=['POST'])
 def add_preview():
     data = request.json
     user_name = data.get('userName')
@@ -728,52 +2988,333 @@ def add_preview():
         products_str = ", ".join([p['name'] for p in products])
 
     conn = get_db_connection()
-    conn.execute('INSERT INTO previews (user_name, user_phone, preview_address, schedule_date, products) VALUES (?, ?, ?, ?, ?)', (user_name, user_phone, preview_address, schedule_date, products_str))
+    cursor = conn.execute('INSERT INTO previews (user_name, user_phone, preview_address, schedule_date, products) VALUES (?, ?, ?, ?, ?)', (user_name, user_phone, preview_address, schedule_date, products_str))
+    apply_preview_stats(conn, cursor.lastrowid, 1)
     conn.commit()
     conn.close()
     return jsonify({"message": "success"}), 201
 
-@app.route('/api/previews/<int:preview_id>/status', methods=['PUT'])
+@api.route('/api/previews/<int:preview_id>/status', methods=['PUT'])
 def update_preview_status(preview_id):
     data = request.json
     status = data.get('status')
 
     conn = get_db_connection()
+    apply_preview_stats(conn, preview_id, -1)
     conn.execute('UPDATE previews SET status = ? WHERE id = ?', (status, preview_id))
+    apply_preview_stats(conn, preview_id, 1)
     conn.commit()
     conn.close()
     return jsonify({"message": "success", "changes": 1})
 
-if __name__ == '__main__':
-    app.run(debug=True, port=3000)
-
-# Dashboard Analytics
-@app.route('/api/dashboard/sales', methods=['GET'])
-def get_total_sales():
+# Change feed: every write to a table behind an admin list lands in change_log (see
+# migrate_change_log/migrate_change_feed) with an increasing seq. Clients load a list
+# once, then ask /api/changes?since=<seq> for what changed, or keep
+# /api/changes/stream open to have the same entries pushed as Server-Sent Events.
+# Entries carry the row as it is now, in the shape its list endpoint returns, and
+# repeated changes to a row within one response collapse into its latest entry.
+# Entries older than CHANGE_LOG_RETENTION are pruned; a client that falls behind
+# that gets reset: true and should reload its lists.
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_LOG_RETENTION = 7 * 86400
+CHANGE_LOG_PRUNE_INTERVAL = int(os.environ.get('CHANGE_LOG_PRUNE_INTERVAL', 3600))
+CHANGE_STREAM_POLL = 0.5
+CHANGE_STREAM_KEEPALIVE = 15
+# Each stream holds a server thread; past this the client reconnects with Last-Event-ID.
+# serve.py moves streams off its request slots (environ['seefirst.detach']); a stream
+# it has no stream slot for keeps its request slot, so it only stays open briefly.
+CHANGE_STREAM_DURATION = 300
+CHANGE_STREAM_SLOT_DURATION = 15
+CHANGE_STREAM_RETRY_MS = 1000
+# entity -> (query for its rows, id column)
+CHANGE_FEED_SOURCES = {
+    'product': ('SELECT %s FROM products' % ', '.join(PRODUCT_FIELDS), 'products.id'),
+    'category': ('SELECT * FROM categories', 'categories.id'),
+    'banner': ('SELECT * FROM banners', 'banners.id'),
+    'order': (ORDER_ROW_SQL, 'o.id'),
+    'preview': ('SELECT * FROM previews', 'previews.id'),
+    'user': (USER_ROW_SQL, 'u.id'),
+}
+
+def read_change_feed(conn, since, entities, limit=CHANGE_FEED_PAGE_SIZE):
+    # The position is read first: anything committed later has a higher seq, so
+    # next_since can skip past entries the entity filter left out
+    latest = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+    oldest = conn.execute('SELECT MIN(seq) FROM change_log').fetchone()[0]
+    if since is None:
+        return {"data": [], "next_since": latest, "has_more": False, "reset": False}
+    if since > latest or oldest is not None and since < oldest - 1:
+        return {"data": [], "next_since": latest, "has_more": False, "reset": True}
+
+    query = 'SELECT seq, entity, entity_id, op, changed_at FROM change_log WHERE seq > ?'
+    params = [since]
+    if entities:
+        query += ' AND entity IN (%s)' % ', '.join('?' * len(entities))
+        params.extend(entities)
+    rows = conn.execute(query + ' ORDER BY seq LIMIT ?', params + [limit + 1]).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_since = rows[-1]['seq'] if has_more else max([latest] + [row['seq'] for row in rows])
+
+    # Keep the last entry per row, then read the current rows one query per entity
+    latest_entries = {}
+    for row in rows:
+        latest_entries.pop((row['entity'], row['entity_id']), None)
+        latest_entries[(row['entity'], row['entity_id'])] = row
+    ids_by_entity = {}
+    for entity, entity_id in latest_entries:
+        ids_by_entity.setdefault(entity, []).append(entity_id)
+    current = {}
+    for entity, ids in ids_by_entity.items():
+        if entity not in CHANGE_FEED_SOURCES:
+            continue
+        query, id_column = CHANGE_FEED_SOURCES[entity]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for row in conn.execute('%s WHERE %s IN (%s)' % (query, id_column, ', '.join('?' * len(chunk))), chunk):
+                current[(entity, row['id'])] = dict(row)
+
+    changes = []
+    for key, row in latest_entries.items():
+        data = current.get(key)
+        changes.append({"seq": row['seq'], "entity": row['entity'], "id": row['entity_id'],
+                        "op": 'delete' if data is None else row['op'], "changed_at": row['changed_at'], "data": data})
+    return {"data": changes, "next_since": next_since, "has_more": has_more, "reset": False}
+
+def parse_change_feed_args():
+    # Returns (since, entities), or an error response
+    since = request.args.get('since', request.headers.get('Last-Event-ID'))
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return None, (jsonify({"error": "since must be an integer"}), 400)
+    entities = [entity for entity in request.args.get('entity', '').split(',') if entity]
+    unknown = [entity for entity in entities if entity not in CHANGE_FEED_SOURCES]
+    if unknown:
+        return None, (jsonify({"error": "Unknown entity; choose from: " + ', '.join(CHANGE_FEED_SOURCES)}), 400)
+    return (since, entities), None
+
+@api.route('/api/changes', methods=['GET'])
+def get_changes():
+    # ?since=<seq>&entity=order,preview&limit=; without since, just the current position
+    args, error = parse_change_feed_args()
+    if error:
+        return error
+    since, entities = args
+    limit = min(max(request.args.get('limit', CHANGE_FEED_PAGE_SIZE, type=int), 1), CHANGE_FEED_PAGE_SIZE)
     conn = get_db_connection()
-    total_sales = conn.execute('SELECT SUM(total) FROM new_orders').fetchone()[0]
+    feed = read_change_feed(conn, since, entities, limit)
     conn.close()
-    return jsonify({"total_sales": total_sales or 0})
+    return jsonify(dict(feed, message="success"))
+
+@api.route('/api/changes/stream', methods=['GET'])
+def stream_changes():
+    # Server-Sent Events; starts at ?since= or Last-Event-ID, else at the current position
+    args, error = parse_change_feed_args()
+    if error:
+        return error
+    since, entities = args
+    detach = request.environ.get('seefirst.detach')
+    duration = CHANGE_STREAM_DURATION if detach is None or detach() else CHANGE_STREAM_SLOT_DURATION
+
+    # The generator outlives this request's app context, so it takes connections itself
+    def generate():
+        position = since
+        deadline = time.monotonic() + duration
+        last_sent = time.monotonic()
+        yield 'retry: %d\n\n' % CHANGE_STREAM_RETRY_MS
+        while time.monotonic() < deadline:
+            conn = db_pool.acquire()
+            try:
+                feed = read_change_feed(conn, position, entities)
+            finally:
+                conn.close()
+            if feed['reset']:
+                yield 'event: reset\ndata: {"next_since": %d}\n\n' % feed['next_since']
+                last_sent = time.monotonic()
+            for change in feed['data']:
+                yield 'id: %d\nevent: change\ndata: %s\n\n' % (change['seq'], json.dumps(change, default=str))
+                last_sent = time.monotonic()
+            position = feed['next_since']
+            if time.monotonic() - last_sent > CHANGE_STREAM_KEEPALIVE:
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+            if not feed['has_more']:
+                time.sleep(CHANGE_STREAM_POLL)
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def prune_change_log(conn, retention=CHANGE_LOG_RETENTION):
+    # Entries are in changed_at order, so the first one inside the retention window
+    # bounds the delete. The newest entry always stays so MAX(seq) never goes back.
+    first_kept = conn.execute("SELECT seq FROM change_log WHERE changed_at >= DATETIME('now', ?) ORDER BY seq LIMIT 1", ('-%d seconds' % retention,)).fetchone()
+    cutoff = first_kept[0] if first_kept else conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+    deleted = conn.execute('DELETE FROM change_log WHERE seq < ?', (cutoff,)).rowcount
+    conn.commit()
+    return deleted
 
-@app.route('/api/dashboard/previews/count', methods=['GET'])
-def get_preview_count():
-    conn = get_db_connection()
-    preview_count = conn.execute('SELECT COUNT(*) FROM previews').fetchone()[0]
-    conn.close()
-    return jsonify({"preview_count": preview_count or 0})
+def run_change_log_pruning(interval):
+    while True:
+        time.sleep(interval)
+        conn = db_pool.acquire()
+        try:
+            deleted = prune_change_log(conn)
+            if deleted:
+                logger.info('Pruned %d change log entries.', deleted)
+        except Exception:
+            logger.exception('Change log pruning failed')
+        finally:
+            conn.close()
 
-@app.route('/api/dashboard/monthly_sales', methods=['GET'])
-def get_monthly_sales():
-    conn = get_db_connection()
-    # This query groups sales by month and year
-    monthly_sales = conn.execute("SELECT STRFTIME('%Y-%m', created_at) as month, SUM(total) as total_amount FROM new_orders GROUP BY month ORDER BY month").fetchall()
+@api.cli.command('prune-changes')
+@click.option('--retention', default=CHANGE_LOG_RETENTION, show_default=True, help='Keep entries younger than this many seconds.')
+def prune_changes_command(retention):
+    """Delete change feed entries older than the retention window."""
+    init_db()
+    conn = db_pool.acquire()
+    deleted = prune_change_log(conn, retention)
     conn.close()
-    return jsonify({"data": [dict(row) for row in monthly_sales]})
+    print('Pruned %d change log entries.' % deleted)
+
+# Streaming exports: /api/export/<table>?format=csv|ndjson&since=&until=
+# Rows are read from the cursor in batches and written out as they arrive,
+# so memory stays flat no matter how many rows match.
+EXPORT_BATCH_SIZE = 500
+# table -> (query, date column used by since/until)
+EXPORTS = {
+    'orders': ('SELECT * FROM new_orders o', 'o.created_at'),
+    'order_items': ('SELECT i.*, o.created_at FROM order_items i JOIN new_orders o ON o.id = i.order_id', 'o.created_at'),
+    'customers': ('''
+        SELECT u.id, u.name, u.phone, u.email, u.is_active,
+               COALESCE(s.order_count, 0) as order_count,
+               COALESCE(s.lifetime_value, 0) as lifetime_value,
+               s.last_order_at
+        FROM users u LEFT JOIN customer_stats s ON s.phone = u.phone
+    ''', 's.last_order_at'),
+    'products': ('SELECT * FROM products p', None),
+}
+
+@api.route('/api/export/<table>', methods=['GET'])
+def export_table(table):
+    if table not in EXPORTS:
+        return jsonify({"error": "Unknown export; choose one of: " + ', '.join(EXPORTS)}), 404
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    query, date_column = EXPORTS[table]
+    since = request.args.get('since')
+    until = request.args.get('until')
+    where_clauses = []
+    params = []
+    if (since or until) and date_column is None:
+        return jsonify({"error": "%s has no date column to filter on" % table}), 400
+    if since:
+        where_clauses.append('%s >= ?' % date_column)
+        params.append(since)
+    if until:
+        where_clauses.append("%s < DATE(?, '+1 day')" % date_column)
+        params.append(until)
+    if where_clauses:
+        query += ' WHERE ' + ' AND '.join(where_clauses)
 
-@app.route('/api/dashboard/monthly_previews', methods=['GET'])
-def get_monthly_previews():
-    conn = get_db_connection()
-    # This query groups previews by month and year
-    monthly_previews = conn.execute("SELECT STRFTIME('%Y-%m', created_at) as month, COUNT(*) as total_previews FROM previews GROUP BY month ORDER BY month").fetchall()
-    conn.close()
-    return jsonify({"data": [dict(row) for row in monthly_previews]})
\ No newline at end of file
+    # The generator outlives this request's app context, so it owns its connection
+    def generate():
+        conn = db_pool.acquire()
+        try:
+            cursor = conn.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if export_format == 'csv':
+                writer.writerow(columns)
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                if export_format == 'csv':
+                    writer.writerows(rows)
+                else:
+                    for row in rows:
+                        buffer.write(json.dumps(dict(zip(columns, row)), default=str))
+                        buffer.write('\n')
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if export_format == 'csv' and buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            conn.close()
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = '%s.%s' % (table, export_format)
+    return Response(generate(), mimetype=mimetype, headers={'Content-Disposition': 'attachment; filename=' + filename})
+
+def create_app(config=None):
+    global db_pool, order_writer, catalog, response_cache, product_count_cache, metrics, variant_cache_bytes
+    app = Flask(__name__)
+    app.config.update(
+        DATABASE=DATABASE,
+        UPLOAD_FOLDER=UPLOAD_FOLDER,
+        VARIANT_FOLDER=VARIANT_FOLDER,
+        STATIC_BUILD_FOLDER=STATIC_BUILD_FOLDER,
+        DB_POOL_SIZE=DB_POOL_SIZE,
+        UPLOAD_GC_INTERVAL=UPLOAD_GC_INTERVAL,
+        CHANGE_LOG_PRUNE_INTERVAL=CHANGE_LOG_PRUNE_INTERVAL,
+        # Longest a checkout waits for others to share its commit, in seconds
+        ORDER_BATCH_DELAY=ORDER_BATCH_DELAY,
+        # Serve /api/products from the in-memory catalog where it can
+        CATALOG_ENGINE=True,
+        # serve.py starts background threads in each worker after forking instead
+        START_BACKGROUND_JOBS=True,
+    )
+    app.config.update(config or {})
+    app.json = FastJSONProvider(app)
+    CORS(app)
+
+    # Create the upload and variant folders if they don't exist
+    for folder in (app.config['UPLOAD_FOLDER'], app.config['VARIANT_FOLDER']):
+        os.makedirs(folder, exist_ok=True)
+
+    # Bring the schema up to date when the app starts
+    db_pool = ConnectionPool(app.config['DATABASE'], app.config['DB_POOL_SIZE'])
+    init_db()
+    order_writer = OrderWriter(app.config['ORDER_BATCH_DELAY'])
+    # Caches and counters belong to one app and database; start them fresh for this one
+    catalog = CatalogIndex()
+    response_cache = ResponseCache()
+    product_count_cache = {}
+    metrics = Metrics()
+    variant_cache_bytes = None
+    if app.config['CATALOG_ENGINE']:
+        # Build the index from the products table now, not on the first product request
+        catalog.sync()
+
+    app.register_blueprint(api)
+    app.before_request(start_request_timer)
+    app.after_request(record_request_metrics)
+    app.after_request(compress_response) # runs first, so request timings include it
+    app.teardown_appcontext(release_db_connection)
+    if app.config['START_BACKGROUND_JOBS']:
+        start_background_jobs(app)
+    return app
+
+def start_background_jobs(app):
+    if app.config['UPLOAD_GC_INTERVAL'] > 0:
+        threading.Thread(target=run_upload_gc, args=(app.config['UPLOAD_FOLDER'], app.config['UPLOAD_GC_INTERVAL']),
+                         name='upload-gc', daemon=True).start()
+    if app.config['CHANGE_LOG_PRUNE_INTERVAL'] > 0:
+        threading.Thread(target=run_change_log_pruning, args=(app.config['CHANGE_LOG_PRUNE_INTERVAL'],),
+                         name='change-log-pruning', daemon=True).start()
+
+def reset_after_fork():
+    # In a freshly forked worker: drop the parent's request metrics, process pool and order queue
+    global metrics, image_executor, variant_executor, order_writer
+    metrics = Metrics()
+    image_executor = None
+    variant_executor = None
+    order_writer = OrderWriter(order_writer.delay)
+
+if __name__ == '__main__':
+    create_app().run(debug=True, port=3000)
@@ -0,0 +1,432 @@
+"""Load test and benchmark harness for the SeeFirst API.
+
+    python benchmark.py seed --db bench/seefirst.db --products 100000 --orders 1000000 --users 50000
+    python benchmark.py run --db bench/seefirst.db --duration 30 --concurrency 8 --out result.json
+    python benchmark.py run --db bench/seefirst.db --url http://localhost:3000 --out result.json
+    python benchmark.py compare baseline.json result.json
+
+`seed` builds a synthetic database with app.py's own migrations. `run` replays a
+weighted mix of storefront and admin requests, through Flask's test client by
+default or against a running server with --url, and writes per-endpoint throughput
+and latency percentiles as JSON. Test-client runs work on a scratch copy of the
+database so every run starts from the same data.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CATEGORIES = ['Sofa', 'Bed', 'Dining Table', 'Chair', 'Wardrobe', 'Shelf', 'Desk', 'Cabinet', 'Lamp', 'Rug',
+              'Mirror', 'Dresser', 'Bench', 'Stool', 'Ottoman', 'Recliner', 'Bookcase', 'TV Stand', 'Crib', 'Mattress']
+ADJECTIVES = ['Classic', 'Modern', 'Rustic', 'Compact', 'Luxury', 'Vintage', 'Nordic', 'Royal', 'Urban', 'Cozy',
+              'Oak', 'Teak', 'Walnut', 'Velvet', 'Leather', 'Folding', 'Corner', 'Kids', 'Outdoor', 'Premium']
+COLORS = ['Black', 'White', 'Brown', 'Grey', 'Beige', 'Blue', 'Green', 'Red']
+CONDITIONS = ['New', 'Used', 'Refurbished']
+ORDER_STATUSES = ['pending', 'Processing', 'Shipped', 'Delivered', 'Delivered', 'Delivered', 'Cancelled']
+PREVIEW_STATUSES = ['Pending', 'Confirmed', 'Completed', 'Cancelled']
+SEED_BATCH = 10000
+
+
+def load_app(workdir):
+    # Returns the app module and a Flask app created against workdir/seefirst.db
+    os.makedirs(workdir, exist_ok=True)
+    sys.path.insert(0, BACKEND_DIR)
+    import app
+    return app, app.create_app({
+        'DATABASE': os.path.join(workdir, 'seefirst.db'),
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'VARIANT_FOLDER': os.path.join(workdir, 'variants'),
+    })
+
+
+def batched(rows, size=SEED_BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def random_timestamp(rng, days):
+    seconds = rng.randrange(days * 86400)
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - seconds))
+
+
+def seed(args):
+    db_path = os.path.abspath(args.db)
+    if os.path.basename(db_path) != 'seefirst.db':
+        sys.exit('--db must point at a file named seefirst.db')
+    if os.path.exists(db_path):
+        if not args.force:
+            sys.exit('%s already exists; pass --force to replace it' % db_path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    app, _ = load_app(os.path.dirname(db_path))
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+
+    db = app.db_pool.acquire()
+    db.execute('BEGIN IMMEDIATE')
+    db.executemany('INSERT INTO categories (name) VALUES (?)', [(name,) for name in CATEGORIES])
+
+    phones = ['01%09d' % n for n in rng.sample(range(10 ** 9), args.users)]
+    users = (('Customer %d' % n, phone, 'customer%d@example.com' % n, 'password', 1 if rng.random() < 0.95 else 0)
+             for n, phone in enumerate(phones, start=1))
+    for batch in batched(users):
+        db.executemany('INSERT INTO users (name, phone, email, password, is_active) VALUES (?, ?, ?, ?, ?)', batch)
+
+    prices = []
+    def products():
+        for n in range(1, args.products + 1):
+            category = rng.choice(CATEGORIES)
+            price = float(rng.randrange(500, 200000, 50))
+            prices.append(price)
+            offer_price = round(price * rng.choice([0, 0, 0.9, 0.8]), 2)
+            yield ('%s %s %s %d' % (rng.choice(ADJECTIVES), rng.choice(ADJECTIVES), category, n),
+                   'A %s %s for everyday use.' % (rng.choice(COLORS).lower(), category.lower()),
+                   price, offer_price, '', category, ', '.join(rng.sample(COLORS, rng.randint(1, 3))),
+                   rng.choice(CONDITIONS), 'BENCH-%08d' % n, rng.randint(0, 50))
+    for batch in batched(products()):
+        db.executemany(app.PRODUCT_INSERT_SQL, batch)
+
+    items = []
+    def orders():
+        for order_id in range(1, args.orders + 1):
+            subtotal = 0.0
+            for _ in range(rng.choice([1, 1, 1, 2, 2, 3])):
+                product_id = rng.randint(1, args.products)
+                quantity = rng.randint(1, 3)
+                items.append((order_id, product_id, quantity, prices[product_id - 1]))
+                subtotal += prices[product_id - 1] * quantity
+            location, charge = rng.choice([('inside_dhaka', 80.0), ('outside_dhaka', 150.0)])
+            payment = rng.choice(['cod', 'cod', 'bkash'])
+            yield ('Customer', rng.choice(phones), 'House %d, Road %d' % (rng.randint(1, 200), rng.randint(1, 50)),
+                   location, payment, 'TRX%08d' % order_id if payment == 'bkash' else None,
+                   subtotal, charge, subtotal + charge, rng.choice(ORDER_STATUSES), random_timestamp(rng, args.days))
+    for batch in batched(orders()):
+        db.executemany('INSERT INTO new_orders (customer_name, customer_phone, delivery_address, delivery_location, payment_method, bkash_trx_id, subtotal, delivery_charge, total, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+        db.executemany('INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)', items)
+        items.clear()
+
+    previews = (('Customer', rng.choice(phones), 'House %d' % rng.randint(1, 200), random_timestamp(rng, args.days)[:10],
+                 'Product %d' % rng.randint(1, args.products), rng.choice(PREVIEW_STATUSES), random_timestamp(rng, args.days))
+                for _ in range(args.orders // 10))
+    for batch in batched(previews):
+        db.executemany('INSERT INTO previews (user_name, user_phone, preview_address, schedule_date, products, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)', batch)
+
+    app.rebuild_rollups(db)
+    app.rebuild_customer_stats(db)
+    # A fresh dataset has no history for change feed clients to catch up on
+    db.execute('DELETE FROM change_log')
+    db.commit()
+    db.execute('PRAGMA optimize')
+    db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    db.close()
+    print('Seeded %d products, %d orders and %d users into %s in %.1fs.' % (args.products, args.orders, args.users, db_path, time.perf_counter() - started))
+
+
+class Workload:
+    # Picks requests from a weighted storefront/admin mix using ids that exist in the database
+
+    def __init__(self, db_path):
+        db = sqlite3.connect(db_path)
+        self.max_product = db.execute('SELECT MAX(id) FROM products').fetchone()[0] or 1
+        self.max_order = db.execute('SELECT MAX(id) FROM new_orders').fetchone()[0] or 1
+        self.phones = [row[0] for row in db.execute('SELECT phone FROM users ORDER BY id LIMIT 1000')] or ['01700000000']
+        # The same ids /api/categories lists
+        self.category_ids = [row[0] for row in db.execute('SELECT id FROM categories')] or [1]
+        self.scale = {table: db.execute('SELECT COUNT(*) FROM %s' % table).fetchone()[0]
+                      for table in ('products', 'new_orders', 'order_items', 'users', 'previews')}
+        db.close()
+        self.mix = [
+            (20, 'GET /api/products', self.browse_products),
+            (8, 'GET /api/products?search=', self.search_products),
+            (8, 'GET /api/products?category_id=', self.category_products),
+            (12, 'GET /api/products/<id>', self.product_detail),
+            (5, 'GET /api/products?ids=', self.cart_products),
+            (6, 'GET /api/categories', lambda rng: ('GET', '/api/categories', None)),
+            (6, 'GET /api/banners', lambda rng: ('GET', '/api/banners', None)),
+            (5, 'POST /create-order', self.create_order),
+            (8, 'GET /api/orders', self.list_orders),
+            (3, 'GET /api/orders?phone=', self.customer_orders),
+            (3, 'GET /api/orders/<id>', self.order_detail),
+            (4, 'GET /api/dashboard/summary', lambda rng: ('GET', '/api/dashboard/summary', None)),
+            (2, 'GET /api/dashboard/daily', self.daily_stats),
+            (2, 'GET /api/users', self.list_users),
+        ]
+        self.total_weight = sum(weight for weight, _, _ in self.mix)
+
+    def pick(self, rng):
+        point = rng.uniform(0, self.total_weight)
+        for weight, name, build in self.mix:
+            point -= weight
+            if point <= 0:
+                return (name,) + build(rng)
+        return (name,) + build(rng)
+
+    def browse_products(self, rng):
+        sort = rng.choice(['newest', 'newest', 'price_asc', 'price_desc'])
+        return 'GET', '/api/products?sort=%s&page=%d' % (sort, rng.choice([1, 1, 1, 2, 3, 10])), None
+
+    def search_products(self, rng):
+        return 'GET', '/api/products?search=%s' % rng.choice(ADJECTIVES + CATEGORIES).replace(' ', '+'), None
+
+    def category_products(self, rng):
+        return 'GET', '/api/products?category_id=%d' % rng.choice(self.category_ids), None
+
+    def product_detail(self, rng):
+        return 'GET', '/api/products/%d' % rng.randint(1, self.max_product), None
+
+    def cart_products(self, rng):
+        ids = [str(rng.randint(1, self.max_product)) for _ in range(rng.randint(1, 5))]
+        return 'GET', '/api/products?ids=%s' % ','.join(ids), None
+
+    def create_order(self, rng):
+        items = [{'id': rng.randint(1, self.max_product), 'quantity': rng.randint(1, 3), 'price': 1000.0}
+                 for _ in range(rng.randint(1, 3))]
+        subtotal = sum(item['quantity'] * item['price'] for item in items)
+        return 'POST', '/create-order', {
+            'customerName': 'Benchmark', 'customerPhone': rng.choice(self.phones), 'deliveryAddress': 'House 1',
+            'deliveryLocation': 'inside_dhaka', 'paymentMethod': 'cod', 'items': items,
+            'subtotal': subtotal, 'deliveryCharge': 80.0, 'total': subtotal + 80.0,
+        }
+
+    def list_orders(self, rng):
+        return 'GET', rng.choice(['/api/orders', '/api/orders?status=pending', '/api/orders?status=Delivered']), None
+
+    def customer_orders(self, rng):
+        return 'GET', '/api/orders?phone=%s' % rng.choice(self.phones), None
+
+    def order_detail(self, rng):
+        return 'GET', '/api/orders/%d' % rng.randint(1, self.max_order), None
+
+    def daily_stats(self, rng):
+        end = time.time() - rng.randrange(365) * 86400
+        return 'GET', '/api/dashboard/daily?from=%s&to=%s' % (time.strftime('%Y-%m-%d', time.gmtime(end - 30 * 86400)), time.strftime('%Y-%m-%d', time.gmtime(end))), None
+
+    def list_users(self, rng):
+        return 'GET', '/api/users?sort=%s&order=desc' % rng.choice(['id', 'order_count', 'lifetime_value', 'last_order_at']), None
+
+
+def test_client_sender(flask_app):
+    client = flask_app.test_client()
+    def send(method, path, body):
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+    return send
+
+
+def http_sender(base_url):
+    def send(method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(base_url.rstrip('/') + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+    return send
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    db_path = os.path.abspath(args.db)
+    if not os.path.exists(db_path):
+        sys.exit('%s does not exist; run `benchmark.py seed` first' % db_path)
+    workload = Workload(db_path)
+    out = os.path.abspath(args.out) if args.out else None
+
+    scratch = None
+    if args.url:
+        make_sender = lambda: http_sender(args.url)
+    else:
+        if args.in_place:
+            _, flask_app = load_app(os.path.dirname(db_path))
+        else:
+            scratch = tempfile.mkdtemp(prefix='seefirst-bench-')
+            shutil.copy(db_path, os.path.join(scratch, 'seefirst.db'))
+            _, flask_app = load_app(scratch)
+        make_sender = lambda: test_client_sender(flask_app)
+
+    results = {}
+    lock = threading.Lock()
+    measuring = threading.Event()
+    stop = threading.Event()
+    remaining = [args.requests] if args.requests else None
+
+    def worker(index):
+        rng = random.Random(args.seed * 1000 + index)
+        send = make_sender()
+        local = {}
+        while not stop.is_set():
+            if remaining is not None and measuring.is_set():
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+            name, method, path, body = workload.pick(rng)
+            started = time.perf_counter()
+            try:
+                status = send(method, path, body)
+            except Exception:
+                status = 599
+            latency = time.perf_counter() - started
+            if measuring.is_set():
+                latencies, errors = local.setdefault(name, ([], [0]))
+                latencies.append(latency)
+                if status >= 500 or (status >= 400 and status != 404):
+                    errors[0] += 1
+        with lock:
+            for name, (latencies, errors) in local.items():
+                total = results.setdefault(name, ([], [0]))
+                total[0].extend(latencies)
+                total[1][0] += errors[0]
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    measuring.set()
+    started = time.perf_counter()
+    if remaining is None:
+        time.sleep(args.duration)
+        stop.set()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    elapsed = time.perf_counter() - started
+
+    all_latencies = [latency for latencies, _ in results.values() for latency in latencies]
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'target': args.url or 'flask-test-client',
+            'concurrency': args.concurrency,
+            'duration_s': round(elapsed, 3),
+            'warmup_s': args.warmup,
+            'seed': args.seed,
+            'scale': workload.scale,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'total': summarize(all_latencies, sum(errors[0] for _, errors in results.values()), elapsed),
+        'endpoints': {name: summarize(latencies, errors[0], elapsed) for name, (latencies, errors) in sorted(results.items())},
+    }
+    if scratch:
+        shutil.rmtree(scratch, ignore_errors=True)
+    output = json.dumps(report, indent=2)
+    if out:
+        with open(out, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    regressions = []
+    print('%-34s %12s %12s %8s %12s %12s %8s' % ('endpoint', 'base p95', 'new p95', 'change', 'base rps', 'new rps', 'change'))
+    names = ['total'] + sorted(set(baseline['endpoints']) & set(candidate['endpoints']))
+    for name in names:
+        old = baseline['total'] if name == 'total' else baseline['endpoints'][name]
+        new = candidate['total'] if name == 'total' else candidate['endpoints'][name]
+        if not old['p95_ms'] or not new['p95_ms'] or not old['throughput_rps']:
+            continue
+        p95_change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+        rps_change = (new['throughput_rps'] - old['throughput_rps']) / old['throughput_rps'] * 100
+        print('%-34s %12.3f %12.3f %+7.1f%% %12.2f %12.2f %+7.1f%%' % (name, old['p95_ms'], new['p95_ms'], p95_change, old['throughput_rps'], new['throughput_rps'], rps_change))
+        if p95_change > args.threshold:
+            regressions.append(name)
+    if regressions:
+        print('p95 regressed by more than %.0f%%: %s' % (args.threshold, ', '.join(regressions)))
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed, load test and compare benchmark runs of the SeeFirst API.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='Create a synthetic database')
+    seed_parser.add_argument('--db', default='bench/seefirst.db')
+    seed_parser.add_argument('--products', type=int, default=100000)
+    seed_parser.add_argument('--orders', type=int, default=1000000)
+    seed_parser.add_argument('--users', type=int, default=50000)
+    seed_parser.add_argument('--days', type=int, default=730, help='Spread order dates over this many days')
+    seed_parser.add_argument('--seed', type=int, default=1)
+    seed_parser.add_argument('--force', action='store_true', help='Replace an existing database')
+    seed_parser.set_defaults(func=seed)
+
+    run_parser = commands.add_parser('run', help='Replay the request mix and report latencies')
+    run_parser.add_argument('--db', default='bench/seefirst.db')
+    run_parser.add_argument('--url', help='Benchmark a running server instead of the Flask test client')
+    run_parser.add_argument('--duration', type=float, default=30)
+    run_parser.add_argument('--requests', type=int, help='Stop after this many measured requests instead of --duration')
+    run_parser.add_argument('--warmup', type=float, default=3)
+    run_parser.add_argument('--concurrency', type=int, default=4)
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--in-place', action='store_true', help='Write orders into --db instead of a scratch copy')
+    run_parser.add_argument('--out', help='Also write the JSON report to this file')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help='Compare two JSON reports')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=10, help='Fail when p95 grows by more than this percentage')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
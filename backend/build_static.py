@@ -0,0 +1,115 @@
+"""Build the admin/ and user/ front ends for production.
+
+    python build_static.py                 # writes static-build/admin and static-build/user
+    python build_static.py --out /srv/seefirst/static
+
+CSS and JS files are renamed to include a hash of their contents (app.js becomes
+app.3f2a9c0b1d4e.js) and the HTML pages are rewritten to reference the new names, so
+app.py can serve assets with an immutable Cache-Control while HTML is revalidated.
+Every file gets a gzip (.gz) copy next to it, and a brotli (.br) copy when the brotli
+package is installed; app.py picks one to match the request's Accept-Encoding.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+try:
+    import brotli # optional, brotli copies are skipped without it
+except ImportError:
+    brotli = None
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BACKEND_DIR)
+SITES = ('admin', 'user')
+HASHED_EXTENSIONS = ('.css', '.js')
+COMPRESSED_EXTENSIONS = ('.html', '.css', '.js', '.svg', '.json', '.txt')
+HASH_LENGTH = 12
+# src="app.js", href="style.css?v=2": local references in HTML pages
+REFERENCE_PATTERN = re.compile(r'''((?:src|href)\s*=\s*["'])([^"'?#]+)([?#][^"']*)?(["'])''')
+
+
+def hashed_name(name, content):
+    base, extension = os.path.splitext(name)
+    return '%s.%s%s' % (base, hashlib.sha256(content).hexdigest()[:HASH_LENGTH], extension)
+
+
+def rewrite_references(html, manifest):
+    # Point local asset references at their hashed names; the ?v= cache busters go away
+    def replace(match):
+        prefix, target, suffix, quote = match.groups()
+        if target not in manifest:
+            return match.group(0)
+        fragment = suffix if suffix and suffix.startswith('#') else ''
+        return prefix + manifest[target] + fragment + quote
+    return REFERENCE_PATTERN.sub(replace, html)
+
+
+def write_file(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+    written = [path]
+    if path.endswith(COMPRESSED_EXTENSIONS):
+        # Only keep a compressed copy that is actually smaller
+        encoded = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(encoded) < len(content):
+            with open(path + '.gz', 'wb') as f:
+                f.write(encoded)
+            written.append(path + '.gz')
+        if brotli is not None:
+            encoded = brotli.compress(content, quality=11)
+            if len(encoded) < len(content):
+                with open(path + '.br', 'wb') as f:
+                    f.write(encoded)
+                written.append(path + '.br')
+    return written
+
+
+def build_site(source, destination):
+    manifest = {}
+    files = sorted(name for name in os.listdir(source) if os.path.isfile(os.path.join(source, name)))
+    contents = {}
+    for name in files:
+        with open(os.path.join(source, name), 'rb') as f:
+            contents[name] = f.read()
+        if name.endswith(HASHED_EXTENSIONS):
+            manifest[name] = hashed_name(name, contents[name])
+
+    os.makedirs(destination)
+    sizes = []
+    for name in files:
+        content = contents[name]
+        if name.endswith('.html'):
+            content = rewrite_references(content.decode('utf-8'), manifest).encode('utf-8')
+        written = write_file(os.path.join(destination, manifest.get(name, name)), content)
+        sizes.append((manifest.get(name, name), [os.path.getsize(path) for path in written]))
+    with open(os.path.join(destination, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hash and precompress the admin and user front ends.')
+    parser.add_argument('--out', default=os.path.join(BACKEND_DIR, 'static-build'))
+    args = parser.parse_args()
+
+    # Build into a staging directory first, so a failed build leaves the previous one in place
+    staging = args.out + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    for site in SITES:
+        sizes = build_site(os.path.join(ROOT_DIR, site), os.path.join(staging, site))
+        for name, (size, *encoded) in sizes:
+            print('%-40s %8d  %s' % (site + '/' + name, size, '  '.join('%8d' % length for length in encoded)))
+    shutil.rmtree(args.out, ignore_errors=True)
+    os.rename(staging, args.out)
+    if brotli is None:
+        print('brotli is not installed: wrote gzip copies only', file=sys.stderr)
+    print('Built %s' % args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""Production server: a preforking master with threaded WSGI workers.
+
+    python serve.py --host 0.0.0.0 --port 3000 --workers 4 --threads 16
+
+The master builds the app once (schema migrations and cache warmup happen here,
+before forking), binds the listening socket and forks the workers, which share it.
+SQLite connections are closed before forking, so each worker opens its own and
+they coordinate through WAL and busy_timeout.
+
+Signals to the master:
+    HUP         graceful reload: re-import app.py, warm up, start new workers,
+                then let the old ones finish their in-flight requests and exit
+    TERM, INT   graceful shutdown
+A worker that dies is replaced.
+
+Each worker serves --threads requests at a time. Open change streams
+(/api/changes/stream, held by every open admin page) don't count against that:
+they move to a separate pool of --stream-threads, so they can't starve storefront
+requests. Size --stream-threads for the admin tabs expected per worker; a stream
+beyond it keeps a request slot and is closed after a few seconds, and the browser
+reconnects.
+"""
+import argparse
+import importlib
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+import app as seefirst
+
+# Requests made in the master before forking so every worker starts with warm caches
+WARMUP_PATHS = (
+    '/api/categories',
+    '/api/banners',
+    '/api/products',
+    '/api/products?page=1',
+    '/api/dashboard/summary',
+)
+
+
+class WorkerRequestHandler(WSGIRequestHandler):
+    def make_environ(self):
+        environ = super().make_environ()
+        environ['seefirst.detach'] = self.detach
+        return environ
+
+    def detach(self):
+        # Called by long-lived responses: trade this connection's request slot for a
+        # stream slot. The connection closes when the response ends.
+        if not self.server.detach_slot():
+            return False
+        self.close_connection = True
+        return True
+
+
+class WorkerServer(ThreadedWSGIServer):
+    # Threaded server on an inherited socket that waits for in-flight requests on shutdown
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, listener, flask_app, threads, stream_threads):
+        self.slots = threading.BoundedSemaphore(threads)
+        self.stream_slots = threading.BoundedSemaphore(stream_threads)
+        self.connection = threading.local() # which slot this connection's thread holds
+        super().__init__(*listener.getsockname()[:2], flask_app, handler=WorkerRequestHandler, fd=listener.fileno())
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        self.connection.detached = False
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            if self.connection.detached:
+                self.stream_slots.release()
+            else:
+                self.slots.release()
+
+    def detach_slot(self):
+        if self.connection.detached:
+            return True
+        if not self.stream_slots.acquire(blocking=False):
+            return False
+        self.connection.detached = True
+        self.slots.release()
+        return True
+
+
+def build_app(config):
+    flask_app = seefirst.create_app(dict(config, START_BACKGROUND_JOBS=False))
+    client = flask_app.test_client()
+    for path in WARMUP_PATHS:
+        response = client.get(path)
+        if response.status_code != 200:
+            print('warmup %s returned %d' % (path, response.status_code), file=sys.stderr)
+    seefirst.db_pool.close_idle()
+    return flask_app
+
+
+def run_worker(listener, flask_app, threads, stream_threads):
+    seefirst.reset_after_fork()
+    seefirst.start_background_jobs(flask_app)
+    server = WorkerServer(listener, flask_app, threads, stream_threads)
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it can't run on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    server.serve_forever()
+    server.server_close() # joins in-flight request threads
+    os._exit(0)
+
+
+class Master:
+    def __init__(self, args):
+        self.args = args
+        self.config = {}
+        if args.database:
+            self.config['DATABASE'] = os.path.abspath(args.database)
+        self.workers = {} # pid -> generation
+        self.generation = 0
+        self.pending_signals = []
+        self.stopping = False
+        self.listener = socket.create_server((args.host, args.port), backlog=args.backlog)
+
+    def spawn(self, flask_app):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            try:
+                run_worker(self.listener, flask_app, self.args.threads, self.args.stream_threads)
+            finally:
+                os._exit(1)
+        self.workers[pid] = self.generation
+
+    def start_generation(self):
+        self.generation += 1
+        self.app = build_app(self.config)
+        for _ in range(self.args.workers):
+            self.spawn(self.app)
+
+    def stop_workers(self, generation=None):
+        for pid, worker_generation in list(self.workers.items()):
+            if generation is None or worker_generation == generation:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            generation = self.workers.pop(pid, None)
+            # Replace workers of the current generation that died unexpectedly
+            if generation == self.generation and not self.stopping:
+                print('worker %d exited with status %d; restarting' % (pid, status), file=sys.stderr)
+                self.spawn(self.app)
+
+    def reload(self):
+        old_generation = self.generation
+        try:
+            importlib.reload(seefirst)
+            self.start_generation()
+        except Exception as e:
+            print('reload failed, keeping the running workers: %s' % e, file=sys.stderr)
+            return
+        self.stop_workers(old_generation)
+        print('reloaded: generation %d serving' % self.generation, file=sys.stderr)
+
+    def run(self):
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, lambda signum, frame: self.pending_signals.append(signum))
+        self.start_generation()
+        print('serving on http://%s:%d with %d workers x %d threads (pid %d)' % (
+            self.args.host, self.args.port, self.args.workers, self.args.threads, os.getpid()), file=sys.stderr)
+        while True:
+            while self.pending_signals:
+                signum = self.pending_signals.pop(0)
+                if signum == signal.SIGHUP:
+                    self.reload()
+                elif signum in (signal.SIGTERM, signal.SIGINT):
+                    self.shutdown()
+                    return
+            self.reap()
+            time.sleep(0.5)
+
+    def shutdown(self):
+        self.stopping = True
+        self.stop_workers()
+        deadline = time.monotonic() + self.args.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.reap()
+        self.listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the SeeFirst API with preforked threaded workers.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent requests per worker')
+    parser.add_argument('--stream-threads', type=int, default=32, help='Open change streams per worker, on top of --threads')
+    parser.add_argument('--backlog', type=int, default=2048)
+    parser.add_argument('--graceful-timeout', type=float, default=30, help='Seconds to wait for in-flight requests on shutdown')
+    parser.add_argument('--database', help='Path to seefirst.db (default: ./seefirst.db)')
+    Master(parser.parse_args()).run()
+
+
+if __name__ == '__main__':
+    main()
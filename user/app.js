@@ -88,6 +88,8 @@ document.addEventListener('DOMContentLoaded', async () => {
             params.append('condition', condition);
         }
         params.append('page', page);
+        // Cards only show the name, price and first image
+        params.append('fields', 'id,name,price,cover_image');
 
         if (params.toString()) {
             apiUrl += `?${params.toString()}`;
@@ -119,7 +121,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
                 for (let j = i; j < i + 5 && j < products.length; j++) {
                     const product = products[j];
-                    const imageUrl = product.image ? `http://localhost:3000/uploads/${product.image.split(',')[0].trim()}` : 'https://placehold.co/400x300';
+                    const imageUrl = product.cover_image ? `http://localhost:3000/uploads/${product.cover_image.trim()}?w=400&h=300` : 'https://placehold.co/400x300';
                     const productCard = `
                         <div class="new-arrival-item">
                             <div class="card shadow-sm h-100 new-arrival-card">
@@ -144,7 +146,7 @@ document.addEventListener('DOMContentLoaded', async () => {
         } else {
             console.log(`Loading products for ${containerSelector}`);
             products.forEach(product => {
-                const imageUrl = product.image ? `http://localhost:3000/uploads/${product.image.split(',')[0].trim()}` : 'https://placehold.co/400x300';
+                const imageUrl = product.cover_image ? `http://localhost:3000/uploads/${product.cover_image.trim()}?w=400&h=300` : 'https://placehold.co/400x300';
                 const productCard = `
                     <div class="col-6 col-md-3">
                         <div class="card shadow-sm h-100 ${cardClass}">
@@ -208,7 +210,7 @@ document.addEventListener('DOMContentLoaded', async () => {
         if (categoryContainer) {
             categoryContainer.innerHTML = ''; // Clear existing content
             data.data.forEach(category => {
-                const imageUrl = category.image ? `http://localhost:3000/uploads/${category.image}` : 'https://placehold.co/100x100';
+                const imageUrl = category.image ? `http://localhost:3000/uploads/${category.image}?w=150&h=150` : 'https://placehold.co/100x100';
                 const categoryCard = `
                     <div class="col-auto">
                         <a href="products.html?category_id=${category.id}" class="text-decoration-none">
@@ -308,7 +310,7 @@ document.addEventListener('DOMContentLoaded', async () => {
                             </div>
                             <div class="thumbnail-container d-flex gap-2">
                                 ${images.map(img => `
-                                    <img src="http://localhost:3000/uploads/${img}" class="img-thumbnail product-thumbnail" alt="Thumbnail">
+                                    <img src="http://localhost:3000/uploads/${img}?w=150&h=150" data-full-src="http://localhost:3000/uploads/${img}" class="img-thumbnail product-thumbnail" alt="Thumbnail">
                                 `).join('')}
                             </div>
                         </div>
@@ -347,7 +349,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
             document.querySelectorAll('.product-thumbnail').forEach(thumbnail => {
                 thumbnail.addEventListener('click', function() {
-                    document.getElementById('mainProductImage').src = this.src;
+                    document.getElementById('mainProductImage').src = this.dataset.fullSrc;
                     document.querySelectorAll('.product-thumbnail').forEach(t => t.classList.remove('active'));
                     this.classList.add('active');
                 });
@@ -386,7 +388,7 @@ document.addEventListener('DOMContentLoaded', async () => {
             const bannerItem = document.createElement('div');
             bannerItem.className = `carousel-item ${index === 0 ? 'active' : ''}`;
             bannerItem.innerHTML = `
-                <img src="http://localhost:3000/uploads/${banner.image}" class="d-block w-100 rounded shadow-sm" alt="Promotional Banner ${index + 1}">
+                <img src="http://localhost:3000/uploads/${banner.image}?w=1600&h=600" class="d-block w-100 rounded shadow-sm" alt="Promotional Banner ${index + 1}">
             `;
             bannerCarouselInner.appendChild(bannerItem);
             console.log(`Added banner ${index + 1}: ${banner.image}`);
@@ -638,8 +640,8 @@ document.addEventListener('DOMContentLoaded', async () => {
         window.location.href = 'index.html'; // Redirect to home page
     }
 
-    // Function to load user orders
-    async function loadUserOrders() {
+    // Function to load user orders, newest first; "Load more" appends the next page
+    async function loadUserOrders(cursor = null) {
         const ordersContainer = document.getElementById('orders-container');
         if (!ordersContainer) return;
 
@@ -651,10 +653,18 @@ document.addEventListener('DOMContentLoaded', async () => {
             return;
         }
 
-        const response = await fetch(`http://localhost:3000/api/orders?user_phone=${userData.phone}`);
+        let url = `http://localhost:3000/api/orders?user_phone=${encodeURIComponent(userData.phone)}`;
+        if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+        const response = await fetch(url);
         const data = await response.json();
 
-        if (data.data.length === 0) {
+        const loadMoreButton = document.getElementById('load-more-orders');
+        if (loadMoreButton) {
+            loadMoreButton.style.display = data.next_cursor ? 'inline-block' : 'none';
+            loadMoreButton.onclick = () => loadUserOrders(data.next_cursor);
+        }
+
+        if (!cursor && data.data.length === 0) {
             ordersContainer.innerHTML = '<p>You have no orders yet.</p>';
         } else {
             let ordersHtml = '';
@@ -673,7 +683,11 @@ document.addEventListener('DOMContentLoaded', async () => {
                     </div>
                 `;
             });
-            ordersContainer.innerHTML = ordersHtml;
+            if (cursor) {
+                ordersContainer.insertAdjacentHTML('beforeend', ordersHtml);
+            } else {
+                ordersContainer.innerHTML = ordersHtml;
+            }
         }
     }
 
@@ -737,6 +751,26 @@ document.addEventListener('DOMContentLoaded', async () => {
         }
     }
 
+    // Re-price cart items from the server with a single batch lookup
+    async function refreshCartProducts() {
+        const cart = JSON.parse(localStorage.getItem('cart')) || [];
+        if (cart.length === 0) return;
+        const ids = cart.map(item => item.id).join(',');
+        try {
+            const response = await fetch(`http://localhost:3000/api/products?ids=${ids}&fields=name,description,price,image,condition`);
+            if (!response.ok) return;
+            const data = await response.json();
+            // Results come back in cart order; null means the product no longer exists
+            const refreshedCart = cart
+                .map((item, index) => data.data[index] ? { ...item, ...data.data[index], quantity: item.quantity } : null)
+                .filter(item => item !== null);
+            localStorage.setItem('cart', JSON.stringify(refreshedCart));
+            updateCartCount();
+        } catch (error) {
+            console.error('Error refreshing cart products:', error);
+        }
+    }
+
     // Function to render cart items
     function renderCartItems() {
         const cartContainer = document.getElementById('cart-items-container');
@@ -796,6 +830,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
 
     if (path.includes('cart.html')) {
+        await refreshCartProducts();
         renderCartItems();
 
         document.getElementById('proceed-to-checkout-btn').addEventListener('click', (event) => {